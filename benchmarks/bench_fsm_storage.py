@@ -0,0 +1,85 @@
+# --- Standard libraries ---
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- Third-party libraries ---
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+# --- Internal modules ---
+from services.fsm_storage import SQLiteStorage
+
+USERS = 1000  # Users going through the wizard
+STEPS = 8  # state.update_data() calls per flow
+
+PROFILE_DRAFT = {
+    "id": 1, "user_id": 123456789, "name": "Main", "min_price": 5000, "max_price": 10000,
+    "min_supply": 1000, "max_supply": 10000, "limit": 1000000, "count": 5,
+    "target_user_id": 123456789, "target_chat_id": None, "target_type": "user_id",
+    "sender": "bot", "bought": 0, "spent": 0, "done": False,
+}
+
+
+async def run_flows(storage) -> dict[str, float]:
+    """
+    Average microseconds per get_state / set_state / update_data / get_data over one wizard flow per user.
+    """
+    totals = {"get_state": 0.0, "set_state": 0.0, "update_data": 0.0, "get_data": 0.0}
+    for user_id in range(USERS):
+        key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+        start = time.perf_counter()
+        await storage.update_data(key, {"profile_draft": dict(PROFILE_DRAFT), "profile_index": 0, "message_id": 10})
+        totals["update_data"] += time.perf_counter() - start
+
+        for step in range(STEPS):
+            start = time.perf_counter()
+            await storage.get_state(key)
+            totals["get_state"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            await storage.set_state(key, f"ConfigWizard:step_{step}")
+            totals["set_state"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            await storage.update_data(key, {f"VALUE_{step}": step * 1000})
+            totals["update_data"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            await storage.get_data(key)
+            totals["get_data"] += time.perf_counter() - start
+    return {
+        name: total / (USERS * (STEPS + (name == "update_data"))) * 1e6
+        for name, total in totals.items()
+    }
+
+
+async def main():
+    print(f"{USERS} wizard flows, {STEPS} steps each")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, storage in (
+            ("memory", MemoryStorage()),
+            ("sqlite", SQLiteStorage(os.path.join(tmp, "fsm.sqlite3"))),
+        ):
+            result = await run_flows(storage)
+            print(f"{name:>6}: " + ", ".join(f"{op} {us:6.1f} µs" for op, us in result.items()))
+            await storage.close()
+
+        # Cold reads after a restart: the cache is empty, every first access goes to the file
+        storage = SQLiteStorage(os.path.join(tmp, "fsm.sqlite3"))
+        start = time.perf_counter()
+        for user_id in range(USERS):
+            await storage.get_data(StorageKey(bot_id=1, chat_id=user_id, user_id=user_id))
+        elapsed = time.perf_counter() - start
+        print(f"sqlite after restart: get_data {elapsed / USERS * 1e6:6.1f} µs, "
+              f"file {os.path.getsize(os.path.join(tmp, 'fsm.sqlite3')) / 1024:.0f} KiB")
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+# --- Standard libraries ---
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- Internal modules ---
+from services.catalog import Gift
+
+CATALOG_SIZE = 50000  # Gifts per fetch
+POLLS = 20  # Fetches per run
+
+
+def make_raw_catalog(size: int) -> list[tuple]:
+    """
+    Builds raw (id, price, supply, left, file_id, emoji) rows standing in for Telegram objects.
+    """
+    rng = random.Random(42)
+    rows = []
+    for i in range(size):
+        supply = rng.choice([0, rng.randint(1000, 100000)])
+        rows.append((i, rng.randint(15, 100000), supply, rng.randint(0, supply), f"FILE_{i}", "🎁"))
+    return rows
+
+
+def normalize_dict(row: tuple) -> dict:
+    return {
+        "id": row[0],
+        "price": row[1],
+        "supply": row[2],
+        "left": row[3],
+        "sticker_file_id": row[4],
+        "emoji": row[5]
+    }
+
+
+def normalize_record(row: tuple) -> Gift:
+    return Gift(
+        id=row[0],
+        price=row[1],
+        supply=row[2],
+        left=row[3],
+        sticker_file_id=row[4],
+        emoji=row[5]
+    )
+
+
+def filter_dicts(gifts: list[dict]) -> list[dict]:
+    return [
+        g for g in gifts
+        if 100 <= g.get("price", 0) <= 50000
+        and 1000 <= g.get("supply", 0) <= 50000
+    ]
+
+
+def filter_records(gifts: list[Gift]) -> list[Gift]:
+    return [
+        g for g in gifts
+        if 100 <= g.price <= 50000
+        and 1000 <= (g.supply or 0) <= 50000
+    ]
+
+
+def measure_memory(normalize, rows: list[tuple]) -> int:
+    """
+    Bytes allocated by one normalized catalog.
+    """
+    tracemalloc.start()
+    gifts = [normalize(row) for row in rows]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del gifts
+    return current
+
+
+def measure_time(normalize, flt, rows: list[tuple]) -> tuple[float, float]:
+    """
+    Average seconds per poll spent normalizing and filtering the catalog.
+    """
+    normalize_total = 0.0
+    filter_total = 0.0
+    for _ in range(POLLS):
+        start = time.perf_counter()
+        gifts = [normalize(row) for row in rows]
+        normalize_total += time.perf_counter() - start
+
+        start = time.perf_counter()
+        flt(gifts)
+        filter_total += time.perf_counter() - start
+    return normalize_total / POLLS, filter_total / POLLS
+
+
+def main():
+    rows = make_raw_catalog(CATALOG_SIZE)
+    print(f"Catalog: {CATALOG_SIZE} gifts, {POLLS} polls")
+    for name, normalize, flt in (
+        ("dict", normalize_dict, filter_dicts),
+        ("Gift", normalize_record, filter_records),
+    ):
+        memory = measure_memory(normalize, rows)
+        normalize_time, filter_time = measure_time(normalize, flt, rows)
+        print(
+            f"{name:>5}: {memory / CATALOG_SIZE:6.1f} B/gift, "
+            f"normalize {normalize_time * 1000:7.2f} ms/poll, "
+            f"filter {filter_time * 1000:6.2f} ms/poll"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# --- Standard libraries ---
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- Internal modules ---
+from utils.rate_limiter import KeyedRateLimiter
+
+USERS = 1_000_000  # Distinct users, each pressing the limited button twice
+USERS_PER_SECOND = 2000  # Arrival rate of new users (simulated clock)
+INTERVAL = 3  # Seconds between allowed presses
+MAX_KEYS = 100_000
+COMMANDS_LIMITS = {"/start": 1, "catalog": INTERVAL, "buy_test_gift": 5, "confirm_purchase": 3}
+
+
+class LastTimesLimiter:
+    """
+    The previous limiter: a dict of last call times per user, never evicted, scanning all limits per event.
+    """
+    def __init__(self, commands_limits: dict):
+        self.last_times = {}
+        self.commands_limits = commands_limits
+
+    def hit(self, user_id: int, command: str, now: float) -> bool:
+        for cmd, limit in self.commands_limits.items():
+            if command == cmd:
+                user_times = self.last_times.setdefault(user_id, {})
+                last = user_times.get(cmd, 0)
+                if now - last < limit:
+                    return False
+                user_times[cmd] = now
+        return True
+
+
+def press_all(hit) -> int:
+    """
+    Every user presses the button on arrival and again half an interval later (the second press is limited).
+
+    :return: Presses allowed
+    """
+    allowed = 0
+    for user_id in range(USERS):
+        now = 1000 + user_id / USERS_PER_SECOND
+        allowed += hit(user_id, now)
+        previous = user_id - USERS_PER_SECOND * INTERVAL // 2
+        if previous >= 0:
+            allowed += hit(previous, now)
+    return allowed
+
+
+def measure(make_limiter) -> tuple[float, int, int, int]:
+    """
+    :return: (microseconds per press, presses allowed, bytes held after the run, entries kept)
+    """
+    limiter, hit = make_limiter()
+    start = time.perf_counter()
+    allowed = press_all(hit)
+    elapsed = time.perf_counter() - start
+    presses = USERS + max(0, USERS - USERS_PER_SECOND * INTERVAL // 2)
+    del limiter, hit
+
+    tracemalloc.start()
+    limiter, hit = make_limiter()
+    press_all(hit)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / presses * 1e6, allowed, memory, len(limiter)
+
+
+def last_times_limiter():
+    limiter = LastTimesLimiter(COMMANDS_LIMITS)
+    return limiter.last_times, lambda user_id, now: limiter.hit(user_id, "catalog", now)
+
+
+def bucket_limiter():
+    limiter = KeyedRateLimiter(MAX_KEYS)
+    return limiter, lambda user_id, now: limiter.hit((user_id, "catalog"), COMMANDS_LIMITS["catalog"], now=now)
+
+
+def main():
+    print(f"{USERS} users, {USERS_PER_SECOND} new users/s, {INTERVAL} s interval")
+    for name, make_limiter in (("last_times", last_times_limiter), ("buckets", bucket_limiter)):
+        us, allowed, memory, kept = measure(make_limiter)
+        print(f"{name:>10}: {us:5.2f} µs/press, {allowed} allowed, {memory / 1024 ** 2:6.1f} MiB, {kept} entries kept")
+
+    # Without idle users (everyone inside the interval) the size cap bounds the memory
+    tracemalloc.start()
+    capped = KeyedRateLimiter(MAX_KEYS)
+    for user_id in range(USERS):
+        capped.hit((user_id, "catalog"), 3600, now=1000.0)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'capped':>10}: {memory / 1024 ** 2:6.1f} MiB, {len(capped)} entries kept (max {MAX_KEYS})")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,27 @@
 import asyncio
 
 # --- Third-party libraries ---
-from aiogram import Router, F
+from aiogram import Router
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramBadRequest
 
 # --- Internal modules ---
-from services.config import get_target_display_local, PURCHASE_COOLDOWN
+from services.config import get_target_display_local, PURCHASE_COOLDOWN, CATALOG_PAGE_SIZE
 from services.menu import update_menu
-from services.gifts_bot import get_filtered_gifts
+from services.gifts_manager import get_display_catalog
+from services.catalog import Gift, get_catalog_gift, get_catalog_snapshot
 from services.buy_bot import buy_gift
 from services.buy_userbot import buy_gift_userbot
 from services.balance import refresh_balance
+from services.outbound import outbound_priority, PRIORITY_BULK
+from utils.callbacks import callback_routes, pack_callback
 
 wizard_router = Router()
 
+_page_cache: dict[tuple, InlineKeyboardMarkup] = {}  # (catalog version, page) -> rendered keyboard
+
 class CatalogFSM(StatesGroup):
     """
     States for the FSM Gift Catalog.
@@ -29,25 +34,33 @@ class CatalogFSM(StatesGroup):
     waiting_confirm = State()
 
 
-def gifts_catalog_keyboard(gifts):
+def gifts_catalog_keyboard(gifts, page: int = 0, pages: int = 1):
     """
-    Generates a keyboard for the gift catalog. 
-    Each gift is a separate button, plus a button to return to the main menu.
+    Generates a keyboard for one page of the gift catalog.
+    Each gift is a separate button, plus page navigation and a button to return to the main menu.
     """
     keyboard = []
     for gift in gifts:
-        if gift['supply'] == None:
+        if gift.supply == None:
             btn = InlineKeyboardButton(
-                text=f"{gift['emoji']} — ★{gift['price']:,}",
-                callback_data=f"catalog_gift_{gift['id']}"
+                text=f"{gift.emoji} — ★{gift.price:,}",
+                callback_data=pack_callback("catalog_gift", gift.id)
             )
         else:
             btn = InlineKeyboardButton(
-                text=f"{gift['left']:,} out of {gift['supply']:,} — ★{gift['price']:,}",
-                callback_data=f"catalog_gift_{gift['id']}"
+                text=f"{gift.left:,} out of {gift.supply:,} — ★{gift.price:,}",
+                callback_data=pack_callback("catalog_gift", gift.id)
             )
         keyboard.append([btn])
 
+    # Page navigation
+    if pages > 1:
+        keyboard.append([
+            InlineKeyboardButton(text="⬅️", callback_data=pack_callback("catalog_page", (page - 1) % pages)),
+            InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="catalog_noop"),
+            InlineKeyboardButton(text="➡️", callback_data=pack_callback("catalog_page", (page + 1) % pages))
+        ])
+
     # Button to return to the main menu
     keyboard.append([
         InlineKeyboardButton(
@@ -59,36 +72,84 @@ def gifts_catalog_keyboard(gifts):
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-@wizard_router.callback_query(F.data == "catalog")
+def catalog_page_count(snapshot) -> int:
+    """
+    Number of keyboard pages of the catalog.
+    """
+    return max(1, -(-len(snapshot.gifts) // CATALOG_PAGE_SIZE))
+
+
+def get_catalog_page(snapshot, page: int) -> InlineKeyboardMarkup:
+    """
+    Returns the keyboard of a catalog page, rendering it only once per catalog version.
+    Pages of versions that are no longer kept by the catalog are dropped when a new page is rendered.
+    """
+    key = (snapshot.version, page)
+    markup = _page_cache.get(key)
+    if markup is None:
+        for old_key in [k for k in _page_cache if get_catalog_snapshot(k[0]) is None]:
+            del _page_cache[old_key]
+        start = page * CATALOG_PAGE_SIZE
+        markup = gifts_catalog_keyboard(snapshot.gifts[start:start + CATALOG_PAGE_SIZE], page, catalog_page_count(snapshot))
+        _page_cache[key] = markup
+    return markup
+
+
+@callback_routes.route("catalog")
 async def catalog(call: CallbackQuery, state: FSMContext):
     """
-    Processing the opening of the catalog. Receives a list of gifts and generates a message with a keyboard.
+    Processing the opening of the catalog. Receives a list of gifts and generates a message with the first page.
     """
-    gifts = await get_filtered_gifts(
-        bot=call.bot,
-        min_price=0,
-        max_price=1000000,
-        min_supply=0,
-        max_supply=100000000,
-        unlimited = True
-    )
+    snapshot = await get_display_catalog(call.bot)
+    gifts = snapshot.gifts
 
-    # Save the current catalog in FSM — needed for subsequent steps
-    await state.update_data(gifts_catalog=gifts)
+    # Save the version of the current catalog in FSM — gifts are looked up in the shared catalog cache
+    await state.update_data(catalog_version=snapshot.version)
 
-    gifts_limited = [g for g in gifts if g['supply'] != None]
-    gifts_unlimited = [g for g in gifts if g['supply'] == None]
+    gifts_limited = [g for g in gifts if g.supply != None]
+    gifts_unlimited = [g for g in gifts if g.supply == None]
 
     await call.message.answer(
         f"🧸 Ordinary gifts: <b>{len(gifts_unlimited)}</b>\n"
         f"👜 Unique gifts: <b>{len(gifts_limited)}</b>\n",
-        reply_markup=gifts_catalog_keyboard(gifts)
+        reply_markup=get_catalog_page(snapshot, 0)
     )
 
     await call.answer()
 
 
-@wizard_router.callback_query(F.data == "catalog_main_menu")
+@callback_routes.route("catalog_page", int)
+async def on_catalog_page(call: CallbackQuery, page: int, state: FSMContext):
+    """
+    Switches the catalog message to another page. Pages are rendered from the catalog version pinned
+    in the FSM when the catalog was opened, so every gift shown can be selected.
+    If that version is no longer kept, the current catalog is pinned instead and the user is told so.
+    """
+    data = await state.get_data()
+    snapshot = get_catalog_snapshot(data.get("catalog_version"))
+    notice = None
+    if snapshot is None:
+        snapshot = await get_display_catalog(call.bot)
+        await state.update_data(catalog_version=snapshot.version)
+        notice = "🔄 Catalog was updated."
+    page = min(page, catalog_page_count(snapshot) - 1)
+    try:
+        await call.message.edit_reply_markup(reply_markup=get_catalog_page(snapshot, page))
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+    await call.answer(notice)
+
+
+@callback_routes.route("catalog_noop")
+async def on_catalog_noop(call: CallbackQuery):
+    """
+    Page counter button: does nothing.
+    """
+    await call.answer()
+
+
+@callback_routes.route("catalog_main_menu")
 async def start_callback(call: CallbackQuery, state: FSMContext):
     """
     Shows the main menu by clicking the "Menu" button.
@@ -106,25 +167,24 @@ async def start_callback(call: CallbackQuery, state: FSMContext):
     )
 
 
-@wizard_router.callback_query(F.data.startswith("catalog_gift_"))
-async def on_gift_selected(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("catalog_gift", str)
+async def on_gift_selected(call: CallbackQuery, gift_id: str, state: FSMContext):
     """
     Handler for selecting a gift from the catalog. Requests the number of gifts to purchase from the user.
     """
-    gift_id = call.data.split("_")[-1]
     data = await state.get_data()
-    gifts = data.get("gifts_catalog", [])
-    if not gifts:
+    gift = get_catalog_gift(data.get("catalog_version"), gift_id)
+    if gift is None:
         await call.answer("🚫 Catalog is outdated. Open again.", show_alert=True)
         await safe_edit_text(call.message, "🚫 Catalog is outdated. Open again.", reply_markup=None)
         return
-    gift = next((g for g in gifts if str(g['id']) == gift_id), None)
 
-    gift_display = f"{gift['left']:,} out of {gift['supply']:,}" if gift.get("supply") != None else gift.get("emoji")
+    gift_display = f"{gift.left:,} out of {gift.supply:,}" if gift.supply != None else gift.emoji
 
-    await state.update_data(selected_gift=gift)
+    # Only the selected gift's fields are stored (constant size, survives any FSM serialization)
+    await state.update_data(selected_gift=list(gift))
     await call.message.edit_text(
-        f"🎯 You selected: <b>{gift_display}</b> for ★{gift['price']}\n"
+        f"🎯 You selected: <b>{gift_display}</b> for ★{gift.price}\n"
         f"🎁 Enter <b>quantity</b> to purchase:\n\n"
         f"/cancel - to cancel",
         reply_markup=None
@@ -203,8 +263,8 @@ async def on_recipient_entered(message: Message, state: FSMContext):
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="🤖 Bot", callback_data="catalog_sender_bot"),
-                InlineKeyboardButton(text="👤 Userbot", callback_data="catalog_sender_userbot"),
+                InlineKeyboardButton(text="🤖 Bot", callback_data=pack_callback("catalog_sender", "bot")),
+                InlineKeyboardButton(text="👤 Userbot", callback_data=pack_callback("catalog_sender", "userbot")),
             ],
             [InlineKeyboardButton(text="❌ Cancel", callback_data="cancel_purchase")]
         ]
@@ -217,24 +277,23 @@ async def on_recipient_entered(message: Message, state: FSMContext):
     await state.set_state(CatalogFSM.waiting_sender)
 
 
-@wizard_router.callback_query(F.data.startswith("catalog_sender_"))
-async def on_catalog_sender_selected(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("catalog_sender", str)
+async def on_catalog_sender_selected(call: CallbackQuery, sender: str, state: FSMContext):
     """
     Processes the selection of the sender (bot or userbot).
     """
-    sender = call.data.replace("catalog_sender_", "")
     await state.update_data(sender=sender)
     await call.answer("✅ Sender selected.")
 
     data = await state.get_data()
-    gift = data["selected_gift"]
+    gift = Gift(*data["selected_gift"])
     qty = data["selected_qty"]
-    price = gift.get("price")
+    price = gift.price
     total = price * qty
     target_user_id = data.get("target_user_id")
     target_chat_id = data.get("target_chat_id")
 
-    gift_display = f"{gift['left']:,} out of {gift['supply']:,}" if gift.get("supply") is not None else gift.get("emoji")
+    gift_display = f"{gift.left:,} out of {gift.supply:,}" if gift.supply is not None else gift.emoji
 
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
@@ -260,25 +319,25 @@ async def on_catalog_sender_selected(call: CallbackQuery, state: FSMContext):
     await state.set_state(CatalogFSM.waiting_confirm)
 
 
-@wizard_router.callback_query(F.data == "confirm_purchase")
+@callback_routes.route("confirm_purchase")
 async def confirm_purchase(call: CallbackQuery, state: FSMContext):
     """
     Confirmation and launch of the purchase of the selected gift in the specified number for the selected recipient.
     """
     data = await state.get_data()
     sender = data["sender"]
-    gift = data["selected_gift"]
+    gift = Gift(*data["selected_gift"]) if data.get("selected_gift") else None
     if not gift:
         await call.answer("🚫 The purchase request is not valid. Please try again.", show_alert=True)
         await safe_edit_text(call.message, "🚫 The purchase request is not valid. Please try again.", reply_markup=None)
         return
     await call.message.edit_text(text="⏳ Performing the purchase of gifts...", reply_markup=None)
-    gift_id = gift.get("id")
-    gift_price = gift.get("price")
+    gift_id = gift.id
+    gift_price = gift.price
     qty = data["selected_qty"]
     data_target_user_id=data.get("target_user_id")
     data_target_chat_id=data.get("target_chat_id")
-    gift_display = f"{gift['left']:,} out of {gift['supply']:,}" if gift.get("supply") != None else gift.get("emoji")
+    gift_display = f"{gift.left:,} out of {gift.supply:,}" if gift.supply != None else gift.emoji
 
     bought = 0
     while bought < qty:
@@ -310,6 +369,20 @@ async def confirm_purchase(call: CallbackQuery, state: FSMContext):
         bought += 1
         await asyncio.sleep(PURCHASE_COOLDOWN)
 
+    # Purchase reports yield to interactive messages of other users
+    with outbound_priority(PRIORITY_BULK):
+        await send_purchase_report(call, gift_display, bought, qty, data_target_user_id, data_target_chat_id)
+    
+    await state.clear()
+    await call.answer()
+    await update_menu(bot=call.bot, chat_id=call.message.chat.id, user_id=call.from_user.id, message_id=call.message.message_id)
+
+
+async def send_purchase_report(call: CallbackQuery, gift_display: str, bought: int, qty: int,
+                               data_target_user_id, data_target_chat_id):
+    """
+    Sends the result of a purchase from the catalog.
+    """
     if bought == qty:
         await call.message.answer(f"✅ Purchase of <b>{gift_display}</b> completed successfully!\n"
                                   f"🎁 Purchased gifts: <b>{bought}</b> of <b>{qty}</b>\n"
@@ -321,13 +394,9 @@ async def confirm_purchase(call: CallbackQuery, state: FSMContext):
                                   f"💰 Top up the balance! Check the recipient's address!\n"
                                   f"📦 Check the availability of the gift!\n"
                                   f"🚦 Status changed to 🔴 (inactive).")
-    
-    await state.clear()
-    await call.answer()
-    await update_menu(bot=call.bot, chat_id=call.message.chat.id, user_id=call.from_user.id, message_id=call.message.message_id)
 
 
-@wizard_router.callback_query(lambda c: c.data == "cancel_purchase")
+@callback_routes.route("cancel_purchase")
 async def cancel_callback(call: CallbackQuery, state: FSMContext):
     """
         Cancellation of the purchase of a gift at the confirmation stage.
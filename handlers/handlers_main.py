@@ -7,10 +7,11 @@ from aiogram.fsm.context import FSMContext
 
 # --- Internal modules ---
 from services.config import format_supabase_summary, get_target_display
-from services.database import get_user_data, update_user_data, get_user_profiles
+from services.database import update_user_data, get_user_profiles, get_menu_snapshot
 from services.menu import update_menu, config_action_keyboard 
 from services.balance import refresh_balance
 from services.buy_bot import buy_gift
+from utils.callbacks import callback_routes
 
 def register_main_handlers(dp, bot: Bot, version):
     """
@@ -32,7 +33,7 @@ def register_main_handlers(dp, bot: Bot, version):
         await update_menu(bot=bot, chat_id=message.chat.id, user_id=user_id, message_id=message.message_id)
 
 
-    @dp.callback_query(F.data == "main_menu")
+    @callback_routes.route("main_menu")
     async def start_callback(call: CallbackQuery, state: FSMContext):
         """
         Shows the main menu when the "Menu" button is clicked.
@@ -52,7 +53,7 @@ def register_main_handlers(dp, bot: Bot, version):
         )
 
 
-    @dp.callback_query(F.data == "show_help")
+    @callback_routes.route("show_help")
     async def help_callback(call: CallbackQuery):
         """
         Shows detailed instructions for working with the bot.
@@ -100,7 +101,7 @@ def register_main_handlers(dp, bot: Bot, version):
         await call.message.answer(help_text, reply_markup=button, disable_web_page_preview=True)
 
     
-    @dp.callback_query(F.data == "show_userbot_help")
+    @callback_routes.route("show_userbot_help")
     async def userbot_help_callback(call: CallbackQuery):
         help_text = (
             "🔐 <b>How to get api_id and api_hash for a Telegram account:</b>\n\n"
@@ -125,7 +126,7 @@ def register_main_handlers(dp, bot: Bot, version):
         await call.message.answer(help_text, reply_markup=button, disable_web_page_preview=True)
 
 
-    @dp.callback_query(F.data == "buy_test_gift")
+    @callback_routes.route("buy_test_gift")
     async def buy_test_gift(call: CallbackQuery):
         """
         Purchase of a test gift to check the bot's work.
@@ -170,15 +171,16 @@ def register_main_handlers(dp, bot: Bot, version):
         await update_menu(bot=call.bot, chat_id=call.message.chat.id, user_id=user_id, message_id=call.message.message_id)
 
 
-    @dp.callback_query(F.data == "reset_bought")
+    @callback_routes.route("reset_bought")
     async def reset_bought_callback(call: CallbackQuery):
         """
         Reset counters of purchased gifts and completion statuses for all profiles.
         """
         user_id = call.from_user.id
         
-        # Получаем данные пользователя и его профили из Supabase
-        profiles = await get_user_profiles(user_id)
+        # Получаем все данные меню (пользователь, профили, юзербот) одним параллельным запросом
+        snapshot = await get_menu_snapshot(user_id)
+        profiles = snapshot["profiles"]
         
         # Сбрасываем счетчики во всех профилях
         from services.database import update_user_profile
@@ -191,9 +193,10 @@ def register_main_handlers(dp, bot: Bot, version):
         
         # Устанавливаем статус неактивный
         await update_user_data(user_id, {"active": False})
+        snapshot["user"]["active"] = False
         
-        # Получаем данные для отображения меню
-        menu_text = await format_supabase_summary(user_id)
+        # Текст меню из уже обновленного снимка
+        menu_text = await format_supabase_summary(user_id, snapshot)
         
         try:
             await call.message.edit_text(
@@ -206,22 +209,23 @@ def register_main_handlers(dp, bot: Bot, version):
         await call.answer("Purchase counter reset.")
 
 
-    @dp.callback_query(F.data == "toggle_active")
+    @callback_routes.route("toggle_active")
     async def toggle_active_callback(call: CallbackQuery):
         """
         Switching the bot's status: active/inactive.
         """
         user_id = call.from_user.id
         
-        # Получаем данные пользователя из Supabase
-        user_data = await get_user_data(user_id)
+        # Получаем все данные меню одним параллельным запросом
+        snapshot = await get_menu_snapshot(user_id)
         
         # Переключаем статус
-        new_active = not user_data.get("active", False)
+        new_active = not snapshot["user"].get("active", False)
         await update_user_data(user_id, {"active": new_active})
+        snapshot["user"]["active"] = new_active
         
-        # Получаем текст меню из Supabase
-        menu_text = await format_supabase_summary(user_id)
+        # Текст меню из уже обновленного снимка
+        menu_text = await format_supabase_summary(user_id, snapshot)
         
         await call.message.edit_text(
             menu_text,
@@ -1,8 +1,10 @@
 # --- Standard libraries ---
+import asyncio
 import logging
+from typing import Optional
 
 # --- Third-party libraries ---
-from aiogram import Router, F, Bot
+from aiogram import Router, Bot
 from aiogram.types import Message, CallbackQuery, LabeledPrice, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -13,9 +15,15 @@ from aiogram.exceptions import TelegramBadRequest, TelegramAPIError
 from services.config import get_valid_config, get_target_display, save_config
 from services.menu import update_menu, payment_keyboard
 from services.balance import refresh_balance, refund_all_star_payments
-from services.config import CURRENCY, MAX_PROFILES, add_profile, remove_profile, update_profile
-from services.userbot import is_userbot_active, userbot_send_self, delete_userbot_session, start_userbot, continue_userbot_signin, finish_userbot_signin
+from services.config import CURRENCY, MAX_PROFILES, add_profile, remove_profile
+from services.database import get_user_profiles, update_user_profile
+from services.userbot import (
+    is_userbot_active, userbot_send_self, delete_userbot_session, start_userbot, continue_userbot_signin,
+    finish_userbot_signin, remember_login_api_hash
+)
+from services.recipients import validate_user_recipients
 from utils.misc import now_str, is_valid_profile_name, PHONE_REGEX, API_HASH_REGEX
+from utils.callbacks import callback_routes, pack_callback
 
 logger = logging.getLogger(__name__)
 wizard_router = Router()
@@ -53,7 +61,7 @@ class ConfigWizard(StatesGroup):
     userbot_password = State()
 
 
-@wizard_router.callback_query(F.data == "userbot_menu")
+@callback_routes.route("userbot_menu")
 async def on_userbot_menu(call: CallbackQuery):
     """
     Calls for updating the userbot menu after the callback.
@@ -123,7 +131,7 @@ async def userbot_menu(message: Message, user_id: int, edit: bool = False):
         logger.error(f"⚠️ Error when updating menu: {e}")
 
 
-@wizard_router.callback_query(F.data == "userbot_confirm_delete")
+@callback_routes.route("userbot_confirm_delete")
 async def confirm_userbot_delete(call: CallbackQuery):
     """
     Requests confirmation of userbot session deletion from the user.
@@ -141,7 +149,7 @@ async def confirm_userbot_delete(call: CallbackQuery):
     await call.answer()
 
 
-@wizard_router.callback_query(F.data == "userbot_delete_no")
+@callback_routes.route("userbot_delete_no")
 async def cancel_userbot_delete(call: CallbackQuery):
     """
     Cancels the userbot session deletion process and returns to the menu.
@@ -151,7 +159,7 @@ async def cancel_userbot_delete(call: CallbackQuery):
     await userbot_menu(call.message, user_id, edit=True)
 
 
-@wizard_router.callback_query(F.data == "userbot_delete_yes")
+@callback_routes.route("userbot_delete_yes")
 async def userbot_delete_handler(call: CallbackQuery):
     """
     Deletes the userbot session data from the user's configuration.
@@ -169,7 +177,7 @@ async def userbot_delete_handler(call: CallbackQuery):
     await call.answer()
 
 
-@wizard_router.callback_query(F.data == "userbot_enable")
+@callback_routes.route("userbot_enable")
 async def userbot_enable_handler(call: CallbackQuery):
     """
     Enables the userbot session in the configuration and updates the menu.
@@ -201,7 +209,7 @@ async def userbot_enable_handler(call: CallbackQuery):
     await userbot_menu(call.message, user_id, edit=True)
 
 
-@wizard_router.callback_query(F.data == "userbot_disable")
+@callback_routes.route("userbot_disable")
 async def userbot_disable_handler(call: CallbackQuery):
     """
     Disables the userbot session in the configuration and updates the menu.
@@ -233,7 +241,7 @@ async def userbot_disable_handler(call: CallbackQuery):
     await userbot_menu(call.message, user_id, edit=True)
 
 
-@wizard_router.callback_query(F.data == "init_userbot")
+@callback_routes.route("init_userbot")
 async def init_userbot_handler(call: CallbackQuery, state: FSMContext):
     """
     Starts the process of connecting a new userbot session (step input api_id).
@@ -285,7 +293,8 @@ async def get_api_hash(message: Message, state: FSMContext):
         await message.answer("🚫 Invalid format. Make sure api_hash is copied completely (32 characters).\n\n/cancel — cancel")
         return
 
-    await state.update_data(api_hash=api_hash)
+    # Kept in memory only: the FSM data is persisted
+    remember_login_api_hash(message.from_user.id, api_hash)
     await message.answer("📥 Enter the phone number (in the format <code>+490123456789</code>):\n\n/cancel — cancel")
     await state.set_state(ConfigWizard.userbot_phone)
 
@@ -332,8 +341,7 @@ async def get_code(message: Message, state: FSMContext):
         await message.answer("🚫 Only text input is supported.\n\n/cancel — cancel")
         return
     
-    await state.update_data(code=message.text.strip())
-    success, need_password, retry = await continue_userbot_signin(message, state)
+    success, need_password, retry = await continue_userbot_signin(message, state, message.text.strip())
     if retry:
         return
     if not success:
@@ -378,8 +386,7 @@ async def get_password(message: Message, state: FSMContext):
         await message.answer("🚫 Only text input is supported.\n\n/cancel — cancel")
         return
     
-    await state.update_data(password=message.text.strip())
-    success, retry = await finish_userbot_signin(message, state)
+    success, retry = await finish_userbot_signin(message, state, message.text.strip())
     if retry:
         return
     if success:
@@ -406,7 +413,7 @@ async def get_password(message: Message, state: FSMContext):
     await state.clear()
 
 
-@wizard_router.callback_query(F.data == "userbot_main_menu")
+@callback_routes.route("userbot_main_menu")
 async def userbot_main_menu_callback(call: CallbackQuery, state: FSMContext):
     """
     Shows the main menu by clicking the "Menu" button.
@@ -438,10 +445,10 @@ async def profiles_menu(message: Message, user_id: int):
         profile_name = f'Profile {idx + 1}' if  not profile.get('name') else profile['name']
         btns = [
             InlineKeyboardButton(
-                text=f"✏️ {profile_name}", callback_data=f"profile_edit_{idx}"
+                text=f"✏️ {profile_name}", callback_data=pack_callback("profile_edit", idx)
             ),
             InlineKeyboardButton(
-                text="🗑 Delete", callback_data=f"profile_delete_{idx}"
+                text="🗑 Delete", callback_data=pack_callback("profile_delete", idx)
             ),
         ]
         keyboard.append(btns)
@@ -472,7 +479,7 @@ async def profiles_menu(message: Message, user_id: int):
                          reply_markup=kb)
 
 
-@wizard_router.callback_query(F.data == "profiles_menu")
+@callback_routes.route("profiles_menu")
 async def on_profiles_menu(call: CallbackQuery):
     """
     Handles clicking on the "Profiles" button or navigating to the profile list.
@@ -508,20 +515,20 @@ def profile_edit_keyboard(idx):
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="💰 Price", callback_data=f"edit_profile_price_{idx}"),
-                InlineKeyboardButton(text="📦 Supply", callback_data=f"edit_profile_supply_{idx}"),
+                InlineKeyboardButton(text="💰 Price", callback_data=pack_callback("edit_profile_price", idx)),
+                InlineKeyboardButton(text="📦 Supply", callback_data=pack_callback("edit_profile_supply", idx)),
             ],
             [
-                InlineKeyboardButton(text="🎁 Quantity", callback_data=f"edit_profile_count_{idx}"),
-                InlineKeyboardButton(text="⭐️ Limit", callback_data=f"edit_profile_limit_{idx}")
+                InlineKeyboardButton(text="🎁 Quantity", callback_data=pack_callback("edit_profile_count", idx)),
+                InlineKeyboardButton(text="⭐️ Limit", callback_data=pack_callback("edit_profile_limit", idx))
             ],
             [
-                InlineKeyboardButton(text="👤 Recipient", callback_data=f"edit_profile_target_{idx}"),
-                InlineKeyboardButton(text="📤 Sender", callback_data=f"edit_profile_sender_{idx}")
+                InlineKeyboardButton(text="👤 Recipient", callback_data=pack_callback("edit_profile_target", idx)),
+                InlineKeyboardButton(text="📤 Sender", callback_data=pack_callback("edit_profile_sender", idx))
             ],
             [
-                InlineKeyboardButton(text="🏷️ Name", callback_data=f"edit_profile_name_{idx}"),
-                InlineKeyboardButton(text="⬅️ Back", callback_data=f"edit_profiles_menu_{idx}")
+                InlineKeyboardButton(text="🏷️ Name", callback_data=pack_callback("edit_profile_name", idx)),
+                InlineKeyboardButton(text="⬅️ Back", callback_data=pack_callback("edit_profiles_menu", idx))
             ],
             [
                 InlineKeyboardButton(text="☰ Menu", callback_data="profiles_main_menu")
@@ -530,16 +537,54 @@ def profile_edit_keyboard(idx):
     )
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("profile_edit_"))
-async def on_profile_edit(call: CallbackQuery, state: FSMContext):
+async def load_profile_draft(state: FSMContext, user_id: int, idx: int, reload: bool = False) -> Optional[dict]:
+    """
+    Returns the draft of the edited profile, kept in FSM while the user edits it.
+    Profiles are read from the database only when editing starts or another profile is opened.
+
+    :param idx: Profile index in the user's list
+    :param reload: Read the profile again even if a draft exists
+    :return: Profile data or None if there is no such profile
+    """
+    data = await state.get_data()
+    draft = data.get("profile_draft")
+    if draft is None or reload or data.get("profile_index") != idx:
+        profiles = await get_user_profiles(user_id)
+        if idx < 0 or idx >= len(profiles):
+            return None
+        draft = profiles[idx]
+        await state.update_data(profile_draft=draft, profile_index=idx)
+    return draft
+
+
+async def commit_profile_draft(state: FSMContext, **changes) -> Optional[dict]:
+    """
+    Applies the changed fields to the profile draft and saves them with a single update.
+    Only the changed fields are written, so counters updated by the worker meanwhile are kept.
+
+    :return: Updated draft or None if there is no draft or the update failed
+    """
+    data = await state.get_data()
+    draft = data.get("profile_draft")
+    if draft is None or not draft.get("id"):
+        return None
+    if await update_user_profile(draft["id"], changes) is None:
+        return None
+    draft.update(changes)
+    await state.update_data(profile_draft=draft)
+    return draft
+
+
+@callback_routes.route("profile_edit", int)
+async def on_profile_edit(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Opens the detailed editing screen for a specific profile.
     Shows all profile parameters and inline buttons to select the appropriate parameter for editing.
     """
-    idx = int(call.data.split("_")[-1])
-    config = await get_valid_config(call.from_user.id)
-    profile = config["PROFILES"][idx]
-    await state.update_data(profile_index=idx)
+    profile = await load_profile_draft(state, call.from_user.id, idx, reload=True)
+    if profile is None:
+        await call.answer("Profile not found.", show_alert=True)
+        return
     await state.update_data(message_id=call.message.message_id)
     await call.message.edit_text(
         profile_text(profile, idx, call.from_user.id),
@@ -574,15 +619,14 @@ async def on_profile_name_entered(message: Message, state: FSMContext):
         await state.clear()
         return
 
-    config = await get_valid_config(message.from_user.id)
-    profiles = config.get("PROFILES", [])
-    if idx < 0 or idx >= len(profiles):
+    if await load_profile_draft(state, message.from_user.id, idx) is None:
         await message.answer("Error: profile not found.")
         await state.clear()
         return
 
-    profiles[idx]["name"] = name
-    await save_config(config)
+    if await commit_profile_draft(state, name=name) is None:
+        await message.answer("❌ Failed to save the profile. Please try again.\n\n/cancel — cancel")
+        return
     await message.answer(f"✅ Profile name successfully changed to: <b>{name}</b>")
 
     # Return to profile menu (call your profile function)
@@ -590,18 +634,17 @@ async def on_profile_name_entered(message: Message, state: FSMContext):
     await state.clear()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("edit_profile_price_"))
-async def edit_profile_min_price(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("edit_profile_price", int)
+async def edit_profile_min_price(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Handles clicking on the button to change the minimum price in the profile.
     Moves the user to the input of a new minimum price.
     """
-    idx = int(call.data.split("_")[-1])
-    await state.update_data(profile_index=idx)
+    profile = await load_profile_draft(state, call.from_user.id, idx)
+    if profile is None:
+        await call.answer("Profile not found.", show_alert=True)
+        return
     await state.update_data(message_id=call.message.message_id)
-    config = await get_valid_config(call.from_user.id)
-    profiles = config.get("PROFILES", [])
-    profile = profiles[idx]
     profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
     await call.message.answer(f"✏️ <b>Editing {profile_name}:</b>\n\n"
                               "💰 Minimum gift price, for example: <code>5000</code>\n\n"
@@ -610,18 +653,17 @@ async def edit_profile_min_price(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("edit_profile_supply_"))
-async def edit_profile_min_supply(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("edit_profile_supply", int)
+async def edit_profile_min_supply(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Handles clicking on the button to change the minimum supply for the profile.
     Moves the user to the input of a new minimum supply value.
     """
-    idx = int(call.data.split("_")[-1])
-    await state.update_data(profile_index=idx)
+    profile = await load_profile_draft(state, call.from_user.id, idx)
+    if profile is None:
+        await call.answer("Profile not found.", show_alert=True)
+        return
     await state.update_data(message_id=call.message.message_id)
-    config = await get_valid_config(call.from_user.id)
-    profiles = config.get("PROFILES", [])
-    profile = profiles[idx]
     profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
     await call.message.answer(f"✏️ <b>Editing {profile_name}:</b>\n\n"
                               "📦 Minimum supply for gift, for example: <code>1000</code>\n\n"
@@ -630,18 +672,17 @@ async def edit_profile_min_supply(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("edit_profile_limit_"))
-async def edit_profile_limit(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("edit_profile_limit", int)
+async def edit_profile_limit(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Handles clicking on the button to change the limit (maximum amount of spending) for the profile.
     Moves the user to the input of a new limit.
     """
-    idx = int(call.data.split("_")[-1])
-    await state.update_data(profile_index=idx)
+    profile = await load_profile_draft(state, call.from_user.id, idx)
+    if profile is None:
+        await call.answer("Profile not found.", show_alert=True)
+        return
     await state.update_data(message_id=call.message.message_id)
-    config = await get_valid_config(call.from_user.id)
-    profiles = config.get("PROFILES", [])
-    profile = profiles[idx]
     profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
     await call.message.answer(f"✏️ <b>Editing {profile_name}:</b>\n\n"
                               "⭐️ Enter the number of stars for this profile (for example: <code>10000</code>)\n\n"
@@ -650,18 +691,17 @@ async def edit_profile_limit(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("edit_profile_count_"))
-async def edit_profile_count(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("edit_profile_count", int)
+async def edit_profile_count(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Handles clicking on the button to change the number of gifts in the profile.
     Moves the user to the input of a new number.
     """
-    idx = int(call.data.split("_")[-1])
-    await state.update_data(profile_index=idx)
+    profile = await load_profile_draft(state, call.from_user.id, idx)
+    if profile is None:
+        await call.answer("Profile not found.", show_alert=True)
+        return
     await state.update_data(message_id=call.message.message_id)
-    config = await get_valid_config(call.from_user.id)
-    profiles = config.get("PROFILES", [])
-    profile = profiles[idx]
     profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
     await call.message.answer(f"✏️ <b>Editing {profile_name}:</b>\n\n"
                               "🎁 Maximum number of gifts, for example: <code>5</code>\n\n"
@@ -670,18 +710,17 @@ async def edit_profile_count(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("edit_profile_target_"))
-async def edit_profile_target(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("edit_profile_target", int)
+async def edit_profile_target(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Handles clicking on the button to change the recipient of gifts (user_id or @username).
     Moves the user to the input of a new recipient.
     """
-    idx = int(call.data.split("_")[-1])
-    await state.update_data(profile_index=idx)
+    profile = await load_profile_draft(state, call.from_user.id, idx)
+    if profile is None:
+        await call.answer("Profile not found.", show_alert=True)
+        return
     await state.update_data(message_id=call.message.message_id)
-    config = await get_valid_config(call.from_user.id)
-    profiles = config.get("PROFILES", [])
-    profile = profiles[idx]
     profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
     message_text = (f"✏️ <b>Editing {profile_name}:</b>\n\n"
                     "📥 Enter <b>recipient</b> of the gift:\n\n"
@@ -699,34 +738,28 @@ async def edit_profile_target(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("edit_profile_name_"))
-async def edit_profile_name(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("edit_profile_name", int)
+async def edit_profile_name(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Button "Rename profile". Saves the index and waits for a new name.
     """
-    idx = int(call.data.split("_")[-1])
-    await state.update_data(profile_index=idx)
+    if await load_profile_draft(state, call.from_user.id, idx) is None:
+        await call.answer("Profile not found.", show_alert=True)
+        return
     await call.message.answer(f"✏️ Enter a new name for profile {idx + 1}: (up to 12 characters)\n\n"
                               "/cancel — cancel")
     await state.set_state(ConfigWizard.edit_profile_name)
     await call.answer()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("edit_profile_sender_"))
-async def edit_profile_sender(call: CallbackQuery, state: FSMContext):
-    idx = int(call.data.removeprefix("edit_profile_sender_"))
-    config = await get_valid_config(call.from_user.id)
-    profiles = config.get("PROFILES", [])
-
-    if idx >= len(profiles):
+@callback_routes.route("edit_profile_sender", int)
+async def edit_profile_sender(call: CallbackQuery, idx: int, state: FSMContext):
+    profile = await load_profile_draft(state, call.from_user.id, idx)
+    if profile is None:
         await call.answer("Profile not found.", show_alert=True)
         return
 
-    profile = profiles[idx]
-
-    # Save profile in FSM (we'll edit it)
     await state.set_state(ConfigWizard.edit_gift_sender)
-    await state.update_data(profile_data=profile, profile_index=idx)
 
     profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
     await call.message.edit_text(f"✏️ <b>Editing {profile_name}:</b>\n\n"
@@ -769,17 +802,16 @@ async def handle_gift_sender_input(message: Message, state: FSMContext):
                          "/cancel — cancel")
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("edit_profiles_menu_"))
-async def edit_profiles_menu(call: CallbackQuery):
+@callback_routes.route("edit_profiles_menu", int)
+async def edit_profiles_menu(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Handles returning from profile editing mode to the main profile menu.
     Opens the user's list of all profiles.
     """
-    idx = int(call.data.split("_")[-1])
-    config = await get_valid_config(call.from_user.id)
-    profiles = config.get("PROFILES", [])
-    profile = profiles[idx]
-    profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
+    data = await state.get_data()
+    profile = data.get("profile_draft") if data.get("profile_index") == idx else None
+    profile_name = f'profile {idx+1}' if not profile or not profile.get('name') else profile.get('name')
+    await state.clear()
     await safe_edit_text(call.message, f"✅ Editing <b>{profile_name}</b> completed.", reply_markup=None)
     await profiles_menu(call.message, call.from_user.id)
     await call.answer()
@@ -806,9 +838,7 @@ async def step_edit_min_price(message: Message, state: FSMContext):
         if value <= 0:
             raise ValueError
         await state.update_data(MIN_PRICE=value)
-        config = await get_valid_config(message.from_user.id)
-        profiles = config.get("PROFILES", [])
-        profile = profiles[idx]
+        profile = data.get("profile_draft") or {}
         profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
         await message.answer(f"✏️ <b>Editing {profile_name}:</b>\n\n"
                              "💰 Maximum gift price, for example: <code>10000</code>\n\n"
@@ -845,10 +875,10 @@ async def step_edit_max_price(message: Message, state: FSMContext):
             await message.answer("🚫 Maximum price cannot be less than minimum. Please try again.\n\n/cancel — cancel")
             return
 
-        config = await get_valid_config(message.from_user.id)
-        config["PROFILES"][idx]["MIN_PRICE"] = data["MIN_PRICE"]
-        config["PROFILES"][idx]["MAX_PRICE"] = value
-        await save_config(config)
+        profile = await commit_profile_draft(state, min_price=data["MIN_PRICE"], max_price=value)
+        if profile is None:
+            await message.answer("❌ Failed to save the profile. Please try again.\n\n/cancel — cancel")
+            return
 
         try:
             await message.bot.delete_message(message.chat.id, data["message_id"])
@@ -856,10 +886,11 @@ async def step_edit_max_price(message: Message, state: FSMContext):
             logger.warning(f"Failed to delete message: {e}")
 
         await message.answer(
-            profile_text(config["PROFILES"][idx], idx, message.from_user.id),
+            profile_text(profile, idx, message.from_user.id),
             reply_markup=profile_edit_keyboard(idx)
         )
-        await state.clear()
+        # Leave the step but keep the draft for further edits of the profile
+        await state.set_state(None)
     except ValueError:
         await message.answer("🚫 Enter a positive number. Please try again.\n\n/cancel — cancel")
 
@@ -885,9 +916,7 @@ async def step_edit_min_supply(message: Message, state: FSMContext):
         if value <= 0:
             raise ValueError
         await state.update_data(MIN_SUPPLY=value)
-        config = await get_valid_config(message.from_user.id)
-        profiles = config.get("PROFILES", [])
-        profile = profiles[idx]
+        profile = data.get("profile_draft") or {}
         profile_name = f'profile {idx+1}' if  not profile.get('name') else profile.get('name')
         await message.answer(f"✏️ <b>Editing {profile_name}:</b>\n\n"
                              "📦 Maximum supply for gift, for example: <code>10000</code>\n\n"
@@ -924,10 +953,10 @@ async def step_edit_max_supply(message: Message, state: FSMContext):
             await message.answer("🚫 Maximum supply cannot be less than minimum. Please try again.\n\n/cancel — cancel")
             return
         
-        config = await get_valid_config(message.from_user.id)
-        config["PROFILES"][idx]["MIN_SUPPLY"] = data["MIN_SUPPLY"]
-        config["PROFILES"][idx]["MAX_SUPPLY"] = value
-        await save_config(config)
+        profile = await commit_profile_draft(state, min_supply=data["MIN_SUPPLY"], max_supply=value)
+        if profile is None:
+            await message.answer("❌ Failed to save the profile. Please try again.\n\n/cancel — cancel")
+            return
 
         try:
             await message.bot.delete_message(message.chat.id, data["message_id"])
@@ -935,10 +964,11 @@ async def step_edit_max_supply(message: Message, state: FSMContext):
             logger.warning(f"Failed to delete message: {e}")
 
         await message.answer(
-            profile_text(config["PROFILES"][idx], idx, message.from_user.id),
+            profile_text(profile, idx, message.from_user.id),
             reply_markup=profile_edit_keyboard(idx)
         )
-        await state.clear()
+        # Leave the step but keep the draft for further edits of the profile
+        await state.set_state(None)
     except ValueError:
         await message.answer("🚫 Enter a positive number. Please try again.\n\n/cancel — cancel")
 
@@ -964,9 +994,10 @@ async def step_edit_limit(message: Message, state: FSMContext):
         if value <= 0:
             raise ValueError
         
-        config = await get_valid_config(message.from_user.id)
-        config["PROFILES"][idx]["LIMIT"] = value
-        await save_config(config)
+        profile = await commit_profile_draft(state, limit=value)
+        if profile is None:
+            await message.answer("❌ Failed to save the profile. Please try again.\n\n/cancel — cancel")
+            return
 
         try:
             await message.bot.delete_message(message.chat.id, data["message_id"])
@@ -974,10 +1005,11 @@ async def step_edit_limit(message: Message, state: FSMContext):
             logger.warning(f"Failed to delete message: {e}")
 
         await message.answer(
-            profile_text(config["PROFILES"][idx], idx, message.from_user.id),
+            profile_text(profile, idx, message.from_user.id),
             reply_markup=profile_edit_keyboard(idx)
         )
-        await state.clear()
+        # Leave the step but keep the draft for further edits of the profile
+        await state.set_state(None)
     except ValueError:
         await message.answer("🚫 Enter a positive number. Please try again.\n\n/cancel — cancel")
 
@@ -1003,9 +1035,10 @@ async def step_edit_count(message: Message, state: FSMContext):
         if value <= 0:
             raise ValueError
         
-        config = await get_valid_config(message.from_user.id)
-        config["PROFILES"][idx]["COUNT"] = value
-        await save_config(config)
+        profile = await commit_profile_draft(state, count=value)
+        if profile is None:
+            await message.answer("❌ Failed to save the profile. Please try again.\n\n/cancel — cancel")
+            return
 
         try:
             await message.bot.delete_message(message.chat.id, data["message_id"])
@@ -1013,10 +1046,11 @@ async def step_edit_count(message: Message, state: FSMContext):
             logger.warning(f"Failed to delete message: {e}")
 
         await message.answer(
-            profile_text(config["PROFILES"][idx], idx, message.from_user.id),
+            profile_text(profile, idx, message.from_user.id),
             reply_markup=profile_edit_keyboard(idx)
         )
-        await state.clear()
+        # Leave the step but keep the draft for further edits of the profile
+        await state.set_state(None)
     except ValueError:
         await message.answer("🚫 Enter a positive number. Please try again.\n\n/cancel — cancel")
 
@@ -1059,11 +1093,12 @@ async def step_edit_user_id(message: Message, state: FSMContext):
         await message.answer("🚫 Enter ID or @username of the channel. Please try again.\n\n/cancel — cancel")
         return
     
-    config = await get_valid_config(message.from_user.id)
-    config["PROFILES"][idx]["TARGET_USER_ID"] = target_user
-    config["PROFILES"][idx]["TARGET_CHAT_ID"] = target_chat
-    config["PROFILES"][idx]["TARGET_TYPE"] = target_type
-    await save_config(config)
+    profile = await commit_profile_draft(state, target_user_id=target_user, target_chat_id=target_chat,
+                                         target_type=target_type)
+    if profile is None:
+        await message.answer("❌ Failed to save the profile. Please try again.\n\n/cancel — cancel")
+        return
+    asyncio.create_task(validate_user_recipients(message.bot, message.from_user.id))
 
     try:
         await message.bot.delete_message(message.chat.id, data["message_id"])
@@ -1071,20 +1106,20 @@ async def step_edit_user_id(message: Message, state: FSMContext):
         logger.warning(f"Failed to delete message: {e}")
 
     await message.answer(
-            profile_text(config["PROFILES"][idx], idx, message.from_user.id),
+            profile_text(profile, idx, message.from_user.id),
             reply_markup=profile_edit_keyboard(idx)
         )
-    await state.clear()
+    await state.set_state(None)
 
 
-@wizard_router.callback_query(F.data == "choose_sender_bot")
+@callback_routes.route("choose_sender_bot")
 async def choose_sender_bot(call: CallbackQuery, state: FSMContext):
     """
     Handles selecting "Bot" as the sender when placing an order.
     """
     await save_sender_and_finish(call, state, sender="bot")
 
-@wizard_router.callback_query(F.data == "choose_sender_userbot")
+@callback_routes.route("choose_sender_userbot")
 async def choose_sender_userbot(call: CallbackQuery, state: FSMContext):
     """
     Handles selecting "Userbot" as the sender when placing an order.
@@ -1100,33 +1135,38 @@ async def save_sender_and_finish(call: CallbackQuery, state: FSMContext, sender:
     profile_data = data.get("profile_data")
     idx = data.get("profile_index")  # None — new, number — editing
 
-    if not profile_data:
-        await call.message.answer("❌ Error: profile not found.")
-        await state.clear()
-        return
-    
-    profile_data["SENDER"] = sender
-
-    config = await get_valid_config(call.from_user.id)
-
     if idx is None:
+        if not profile_data:
+            await call.message.answer("❌ Error: profile not found.")
+            await state.clear()
+            return
+
+        profile_data["SENDER"] = sender
+        config = await get_valid_config(call.from_user.id)
         await add_profile(config, profile_data)
         msg = "✅ <b>New profile</b> created."
         await call.message.edit_text(msg)
         await profiles_menu(call.message, call.from_user.id)
+        await state.clear()
     else:
-        await update_profile(config, idx, profile_data)
+        profile = await commit_profile_draft(state, sender=sender)
+        if profile is None:
+            await call.message.answer("❌ Error: profile not found.")
+            await state.clear()
+            return
+
         msg = f"✅ <b>Profile {idx + 1}</b> updated."
         await call.message.edit_text(msg)
         await call.message.answer(
-            profile_text(config["PROFILES"][idx], idx, call.from_user.id),
+            profile_text(profile, idx, call.from_user.id),
             reply_markup=profile_edit_keyboard(idx)
         )
+        await state.set_state(None)
 
-    await state.clear()
+    asyncio.create_task(validate_user_recipients(call.bot, call.from_user.id))
     await call.answer()
 
-@wizard_router.callback_query(F.data == "profile_add")
+@callback_routes.route("profile_add")
 async def on_profile_add(call: CallbackQuery, state: FSMContext):
     """
     Starts the wizard for step-by-step creation of a new profile for gifts.
@@ -1207,7 +1247,7 @@ async def step_user_id(message: Message, state: FSMContext):
     await state.set_state(ConfigWizard.gift_sender)
 
 
-@wizard_router.callback_query(F.data == "profiles_main_menu")
+@callback_routes.route("profiles_main_menu")
 async def profiles_main_menu_callback(call: CallbackQuery, state: FSMContext):
     """
     Shows the main menu by clicking the "Menu" button.
@@ -1225,17 +1265,16 @@ async def profiles_main_menu_callback(call: CallbackQuery, state: FSMContext):
     )
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("profile_delete_"))
-async def on_profile_delete_confirm(call: CallbackQuery, state: FSMContext):
+@callback_routes.route("profile_delete", int)
+async def on_profile_delete_confirm(call: CallbackQuery, idx: int, state: FSMContext):
     """
     Requests confirmation of profile deletion.
     """
-    idx = int(call.data.split("_")[-1])
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(text="✅ Yes", callback_data=f"confirm_delete_{idx}"),
-                InlineKeyboardButton(text="❌ No", callback_data=f"cancel_delete_{idx}"),
+                InlineKeyboardButton(text="✅ Yes", callback_data=pack_callback("confirm_delete", idx)),
+                InlineKeyboardButton(text="❌ No", callback_data=pack_callback("cancel_delete", idx)),
             ]
         ]
     )
@@ -1257,12 +1296,11 @@ async def on_profile_delete_confirm(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("confirm_delete_"))
-async def on_profile_delete_final(call: CallbackQuery):
+@callback_routes.route("confirm_delete", int)
+async def on_profile_delete_final(call: CallbackQuery, idx: int):
     """
     Deletes the profile permanently after confirmation.
     """
-    idx = int(call.data.split("_")[-1])
     config = await get_valid_config(call.from_user.id)
     deafult_added = ("\n➕ <b>Added</b> default profile.\n"
                      "🚦 Status changed to 🔴 (inactive)." if len(config["PROFILES"]) == 1 else "")
@@ -1275,12 +1313,11 @@ async def on_profile_delete_final(call: CallbackQuery):
     await call.answer()
 
 
-@wizard_router.callback_query(lambda c: c.data.startswith("cancel_delete_"))
-async def on_profile_delete_cancel(call: CallbackQuery):
+@callback_routes.route("cancel_delete", int)
+async def on_profile_delete_cancel(call: CallbackQuery, idx: int):
     """
     Cancels profile deletion.
     """
-    idx = int(call.data.split("_")[-1])
     await call.message.edit_text(f"🚫 Deletion of <b>profile {idx + 1}</b> cancelled.", reply_markup=None)
     await profiles_menu(call.message, call.from_user.id)
     await call.answer()
@@ -1301,7 +1338,7 @@ async def safe_edit_text(message, text, reply_markup=None):
             raise
 
 
-@wizard_router.callback_query(F.data == "edit_config")
+@callback_routes.route("edit_config")
 async def edit_config_handler(call: CallbackQuery, state: FSMContext):
     """
     Starts the configuration editing wizard.
@@ -1476,7 +1513,7 @@ async def step_limit(message: Message, state: FSMContext):
         await message.answer("🚫 Enter a positive number. Please try again.\n\n/cancel — cancel")
 
 
-@wizard_router.callback_query(F.data == "deposit_menu")
+@callback_routes.route("deposit_menu")
 async def deposit_menu(call: CallbackQuery, state: FSMContext):
     """
     Moves to the step of topping up the balance.
@@ -1518,7 +1555,7 @@ async def deposit_amount_input(message: Message, state: FSMContext):
         await message.answer("🚫 Enter a number between 1 and 10000. Please try again.\n\n/cancel — cancel")
 
 
-@wizard_router.callback_query(F.data == "refund_menu")
+@callback_routes.route("refund_menu")
 async def refund_menu(call: CallbackQuery, state: FSMContext):
     """
     Moves to the step of returning stars (by transaction ID).
@@ -1570,7 +1607,7 @@ async def refund_input(message: Message, state: FSMContext):
     await state.clear()
 
 
-@wizard_router.callback_query(F.data == "guest_deposit_menu")
+@callback_routes.route("guest_deposit_menu")
 async def guest_deposit_menu(call: CallbackQuery, state: FSMContext):
     """
     Moves to the step of topping up the balance for guests.
@@ -1639,7 +1676,7 @@ async def withdraw_all_handler(message: Message):
     )
 
 
-@wizard_router.callback_query(lambda c: c.data == "withdraw_all_confirm")
+@callback_routes.route("withdraw_all_confirm")
 async def withdraw_all_confirmed(call: CallbackQuery):
     """
     Confirms and starts the process of returning all stars. Displays a report to the user.
@@ -1675,7 +1712,7 @@ async def withdraw_all_confirmed(call: CallbackQuery):
     await update_menu(bot=call.bot, chat_id=call.message.chat.id, user_id=call.from_user.id, message_id=call.message.message_id)
 
 
-@wizard_router.callback_query(lambda c: c.data == "withdraw_all_cancel")
+@callback_routes.route("withdraw_all_cancel")
 async def withdraw_all_cancel(call: CallbackQuery):
     """
     Handles cancellation of returning all stars.
@@ -9,30 +9,39 @@ from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
 
 # --- Internal modules ---
 from services.config import (
     VERSION,
-    PURCHASE_COOLDOWN
+    PURCHASE_COOLDOWN,
+    PURCHASE_PRIORITY,
+    RATE_LIMITS
 )
-from services.database import get_user_data, update_user_data, get_user_profiles
+from services.database import get_user_data, update_user_data, get_user_profiles, get_userbot_owner_ids
 from services.menu import update_menu
 from services.balance import refresh_balance
-from services.gifts_manager import get_best_gift_list, userbot_gifts_updater
+from services.gifts_manager import get_best_gift_list, userbot_gifts_updater, restore_userbot_catalog
+from services.prioritization import prioritize_gifts
+from services.fsm_storage import create_fsm_storage
+from services.rate_limit_store import create_rate_limit_store
 from services.buy_bot import buy_gift
-from services.buy_userbot import buy_gift_userbot
-from services.userbot import try_start_userbot_from_config
+from services.negative_cache import is_blocked
+from services.buy_userbot import buy_gifts_userbot_parallel
+from services.userbot import start_userbots_bulk, userbot_health_supervisor
+from services.recipients import validate_user_recipients, get_recipient_status
 from services.config import get_target_display
 from handlers.handlers_wizard import register_wizard_handlers
 from handlers.handlers_catalog import register_catalog_handlers
 from handlers.handlers_main import register_main_handlers
 from utils.logging import setup_logging
 from utils.proxy import get_aiohttp_session
+from utils.callbacks import callback_routes
 from middlewares.access_control import AccessControlMiddleware
 from middlewares.rate_limit import RateLimitMiddleware
+from middlewares.menu_tracking import MenuTrackingMiddleware
+from middlewares.outbound_queue import OutboundQueueMiddleware
 
 load_dotenv(override=False)
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
@@ -50,6 +59,8 @@ WEBHOOK_URL = f"{WEBHOOK_HOST}{WEBHOOK_PATH}"
 # Webserver settings
 WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
 WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "10000"))
+# FSM storage and rate limits: Redis if set (shared between replicas), otherwise local
+REDIS_URL = os.getenv("REDIS_URL", "")
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -62,6 +73,7 @@ async def gift_purchase_worker(bot):
     If the limit is exhausted - the profile is considered completed and the worker moves to the next one.
     """
     await refresh_balance(bot, USER_ID)
+    await validate_user_recipients(bot, USER_ID)
     while True:
         try:
             # Получаем данные пользователя из Supabase
@@ -101,20 +113,35 @@ async def gift_purchase_worker(bot):
                 TARGET_USER_ID = profile["target_user_id"]
                 TARGET_CHAT_ID = profile["target_chat_id"]
 
+                # Skip profiles whose recipient is known to be unreachable
+                if get_recipient_status(USER_ID, sender, TARGET_USER_ID, TARGET_CHAT_ID) is False:
+                    continue
+
                 filtered_gifts = await get_best_gift_list(bot, profile)
 
                 if not filtered_gifts:
                     continue
 
+                # Purchase order: profile setting or the global default
+                filtered_gifts = await prioritize_gifts(filtered_gifts, profile.get("priority") or PURCHASE_PRIORITY)
+
                 purchases = []
                 before_bought = profile["bought"]
                 before_spent = profile["spent"]
 
                 for gift in filtered_gifts:
-                    gift_id = gift["id"]
-                    gift_price = gift["price"]
-                    gift_total_count = gift["supply"]
-                    sticker_file_id = gift["sticker_file_id"]
+                    gift_id = gift.id
+                    gift_price = gift.price
+                    gift_total_count = gift.supply
+                    sticker_file_id = gift.sticker_file_id
+
+                    # Skip gifts that are known to fail (sold out, not purchasable, bad recipient)
+                    if is_blocked(gift_id, TARGET_USER_ID, TARGET_CHAT_ID):
+                        continue
+
+                    # Free or zero-priced gifts cannot be budgeted (and would divide by zero below)
+                    if gift_price <= 0:
+                        continue
 
                     # Check the limit before each purchase
                     while (profile["bought"] < COUNT and
@@ -131,31 +158,37 @@ async def gift_purchase_worker(bot):
                                 gift_price=gift_price,
                                 file_id=sticker_file_id
                             )
+                            bought_now = 1 if success else 0
                         elif sender == "userbot":
-                            success = await buy_gift_userbot(
+                            # The whole remainder of the order is spread across the userbot accounts
+                            quantity = min(COUNT - profile["bought"], (LIMIT - profile["spent"]) // gift_price)
+                            bought_now = await buy_gifts_userbot_parallel(
                                 session_user_id=USER_ID,
                                 gift_id=gift_id,
                                 target_user_id=TARGET_USER_ID,
                                 target_chat_id=TARGET_CHAT_ID,
                                 gift_price=gift_price,
-                                file_id=sticker_file_id
+                                quantity=quantity
                             )
+                            success = bought_now == quantity
                         else:
                             logger.warning(f"Unknown sender SENDER={sender} in profile {profile_index}")
                             success = False
+                            bought_now = 0
+
+                        if bought_now:
+                            # Обновляем данные профиля в Supabase
+                            profile["bought"] += bought_now
+                            profile["spent"] += gift_price * bought_now
+                            purchases.extend({"id": gift_id, "price": gift_price} for _ in range(bought_now))
+
+                            # Обновляем профиль в таблице profiles
+                            from services.database import update_user_profile
+                            await update_user_profile(profile["id"], profile)
 
                         if not success:
                             any_success = False
                             break  # Failed to buy - try the next gift
-
-                        # Обновляем данные профиля в Supabase
-                        profile["bought"] += 1
-                        profile["spent"] += gift_price
-                        purchases.append({"id": gift_id, "price": gift_price})
-                        
-                        # Обновляем профиль в таблице profiles
-                        from services.database import update_user_profile
-                        await update_user_profile(profile["id"], profile)
                         
                         await asyncio.sleep(PURCHASE_COOLDOWN)
 
@@ -266,31 +299,42 @@ async def main() -> None:
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
         session=await get_aiohttp_session(USER_ID)
     )
+    bot.session.middleware(MenuTrackingMiddleware())
+    bot.session.middleware(OutboundQueueMiddleware())
 
     # Get and update the bot's balance
     await refresh_balance(bot, USER_ID)
 
     try:
-        # Запускаем юзербот, если он есть в конфиге
-        await try_start_userbot_from_config(USER_ID)
+        # Запускаем все юзерботы из базы параллельно
+        userbot_owner_ids = set(await get_userbot_owner_ids()) | {USER_ID}
+        await start_userbots_bulk(userbot_owner_ids)
     except Exception as e:
-        logger.error(f"Failed to start userbot: {e}")
+        logger.error(f"Failed to start userbots: {e}")
 
     # Initialize dispatcher
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = Dispatcher(storage=create_fsm_storage(REDIS_URL))
 
     # Register middlewares
     dp.message.middleware(AccessControlMiddleware())
-    dp.message.middleware(RateLimitMiddleware())
+    rate_limit = RateLimitMiddleware(RATE_LIMITS, store=create_rate_limit_store(REDIS_URL))
+    dp.message.middleware(rate_limit)
+    dp.callback_query.middleware(rate_limit)
 
     # Register handlers
     register_wizard_handlers(dp)
     register_catalog_handlers(dp)
     register_main_handlers(dp, bot, VERSION)
+    # One callback query handler resolving button presses by route name
+    callback_routes.register(dp)
+
+    # Warm start from the catalog saved before the restart
+    restore_userbot_catalog()
 
     # Background tasks
     asyncio.create_task(gift_purchase_worker(bot))
-    asyncio.create_task(userbot_gifts_updater(USER_ID))
+    asyncio.create_task(userbot_gifts_updater())
+    asyncio.create_task(userbot_health_supervisor())
 
     # Clear webhooks
     await bot.delete_webhook(drop_pending_updates=True)
@@ -0,0 +1,43 @@
+# --- Standard libraries ---
+import logging
+
+# --- Third-party libraries ---
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import (
+    EditMessageText,
+    EditMessageCaption,
+    EditMessageMedia,
+    EditMessageReplyMarkup,
+    DeleteMessage,
+    DeleteMessages,
+)
+
+# --- Internal modules ---
+from services.menu import forget_menu_render
+
+logger = logging.getLogger(__name__)
+
+EDIT_METHODS = (EditMessageText, EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup)
+
+
+class MenuTrackingMiddleware(BaseRequestMiddleware):
+    """
+    Outgoing request middleware: tells the menu renderer when a message is edited or deleted,
+    so an in-place menu update is never skipped for a menu message that another handler changed.
+    """
+    async def __call__(self, make_request, bot, method):
+        """
+        Passes the request through and reports edits and deletions of messages.
+        """
+        response = await make_request(bot, method)
+        try:
+            if isinstance(method, EDIT_METHODS) and method.message_id is not None:
+                forget_menu_render(method.chat_id, method.message_id)
+            elif isinstance(method, DeleteMessage):
+                forget_menu_render(method.chat_id, method.message_id, deleted=True)
+            elif isinstance(method, DeleteMessages):
+                for message_id in method.message_ids:
+                    forget_menu_render(method.chat_id, message_id, deleted=True)
+        except Exception as e:
+            logger.error(f"Failed to track menu message: {e}")
+        return response
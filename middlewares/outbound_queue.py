@@ -0,0 +1,23 @@
+# --- Third-party libraries ---
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+# --- Internal modules ---
+from services.outbound import OutboundQueue
+
+
+class OutboundQueueMiddleware(BaseRequestMiddleware):
+    """
+    Outgoing request middleware: routes every Bot API call through the outbound queue,
+    which applies the global and per-chat message limits.
+    """
+    def __init__(self, queue: OutboundQueue = None):
+        """
+        :param queue: Outbound queue (a new one by default)
+        """
+        self.queue = queue or OutboundQueue()
+
+    async def __call__(self, make_request, bot, method):
+        """
+        Sends the request through the queue.
+        """
+        return await self.queue.submit(make_request, bot, method)
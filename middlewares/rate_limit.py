@@ -1,5 +1,4 @@
 # --- Standard libraries ---
-import time
 import logging
 from typing import Optional, List, Dict
 
@@ -7,6 +6,11 @@ from typing import Optional, List, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import Message, TelegramObject, CallbackQuery
 
+# --- Internal modules ---
+from services.config import RATE_LIMIT_MAX_KEYS
+from utils.callbacks import SEPARATOR
+from utils.rate_limiter import KeyedRateLimiter
+
 logger = logging.getLogger(__name__)
 
 class RateLimitMiddleware(BaseMiddleware):
@@ -14,24 +18,31 @@ class RateLimitMiddleware(BaseMiddleware):
     Middleware for spam protection: limits the frequency of command execution and button presses.
     Applicable to both text messages (Message) and CallbackQuery.
 
-    The limitation applies separately for each command and user.
+    The limitation applies separately for each command and user: a token bucket per (user, command)
+    allows one call per interval. Buckets of idle users are evicted, so memory stays bounded.
+    Calls allowed locally are then checked in the store shared by all bot instances; repeated calls are
+    rejected locally first, so the store gets at most one request per user and command per interval.
     Users from the allowed_user_ids list are not limited.
     """
-    def __init__(self, commands_limits: Optional[Dict[str, int]] = None, allowed_user_ids: Optional[List[int]] = None):
+    def __init__(self, commands_limits: Optional[Dict[str, int]] = None, allowed_user_ids: Optional[List[int]] = None,
+                 max_keys: int = RATE_LIMIT_MAX_KEYS, store=None):
         """
-        :param commands_limits: Dictionary with limits in the format {command: interval_in_seconds}
+        :param commands_limits: Dictionary with limits in the format {command: interval_in_seconds};
+                                buttons are limited by their callback route name
         :param allowed_user_ids: List of user_ids allowed to ignore limitations
+        :param max_keys: Maximum number of (user, command) buckets kept in memory
+        :param store: Rate limit store shared by bot instances (see services.rate_limit_store), None for a single instance
         """
-        self.last_times = {}  # user_id -> {command: timestamp}
+        self.limiter = KeyedRateLimiter(max_keys)
+        self.store = store
         self.commands_limits = commands_limits or {}  # command: seconds
-        self.allowed_user_ids = allowed_user_ids or []
+        self.allowed_user_ids = set(allowed_user_ids or [])
 
     async def __call__(self, handler, event: TelegramObject, data: dict):
         """
         Main middleware method: checks the frequency of command/button calls.
         If the limit is exceeded - the message/request is ignored and a warning is sent to the user.
         """
-        now = time.monotonic()
         user_id = None
         command = None
 
@@ -40,27 +51,27 @@ class RateLimitMiddleware(BaseMiddleware):
             command = event.text.split()[0] if event.text else None
         elif isinstance(event, CallbackQuery) and event.from_user:
             user_id = event.from_user.id
-            command = event.data
+            command = event.data.partition(SEPARATOR)[0] if event.data else None
 
         if user_id is None or command is None:
             return await handler(event, data)
 
+        limit = self.commands_limits.get(command)
+        if not limit:
+            return await handler(event, data)
+
         # В публичном режиме мы все равно проверяем частоту запросов для защиты от спама
         # Но мы можем добавить некоторых пользователей в исключения
         if user_id in self.allowed_user_ids:
             return await handler(event, data)
 
-        for cmd, limit in self.commands_limits.items():
-            if command == cmd:
-                user_times = self.last_times.setdefault(user_id, {})
-                last = user_times.get(cmd, 0)
-
-                if now - last < limit:
-                    if isinstance(event, Message):
-                        await event.answer("⏳ Please don't spam. Try again later.")
-                    elif isinstance(event, CallbackQuery):
-                        await event.answer("⏳ Please don't spam.", show_alert=True)
-                    return
-                user_times[cmd] = now
+        if not self.limiter.hit((user_id, command), limit) or (
+            self.store is not None and not await self.store.claim(f"{user_id}:{command}", limit)
+        ):
+            if isinstance(event, Message):
+                await event.answer("⏳ Please don't spam. Try again later.")
+            elif isinstance(event, CallbackQuery):
+                await event.answer("⏳ Please don't spam.", show_alert=True)
+            return
 
-        return await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
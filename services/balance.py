@@ -72,7 +72,7 @@ async def refresh_balance(bot, user_id) -> int:
         
         # Обновляем баланс юзербота (если есть)
         try:
-            userbot_balance = await get_userbot_stars_balance()
+            userbot_balance = await get_userbot_stars_balance(user_id)
             await update_user_data(user_id, {"userbot_balance": userbot_balance})
             logger.info(f"Updated userbot balance for user {user_id}: {userbot_balance} stars")
         except Exception as e:
@@ -210,8 +210,8 @@ async def refund_all_star_payments(bot, username, user_id, message_func=None):
     }
 
 
-async def get_userbot_balance() -> int:
+async def get_userbot_balance(user_id: int = None) -> int:
     """
     Получает баланс stars юзербота.
     """
-    return await get_userbot_stars_balance()
+    return await get_userbot_stars_balance(user_id)
@@ -9,6 +9,7 @@ from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramR
 # --- Internal modules ---
 from services.config import get_valid_config, save_config, DEV_MODE
 from services.balance import change_balance
+from services.negative_cache import mark_failed
 
 logger = logging.getLogger(__name__)
 
@@ -68,7 +69,7 @@ async def buy_gift(
                 break
 
             if result:
-                new_balance = await change_balance(int(-gift_price))
+                new_balance = await change_balance(int(-gift_price), env_user_id)
                 logger.info(f"Successful purchase of gift {gift_id} for {gift_price} stars. Remaining: {new_balance}")
                 return True
             
@@ -84,6 +85,7 @@ async def buy_gift(
 
         except TelegramAPIError as e:
             logger.error(f"Telegram API error: {e}")
+            mark_failed(gift_id, str(e), user_id, chat_id)
             break
 
     logger.error(f"Failed to buy gift {gift_id} after {retries} attempts.")
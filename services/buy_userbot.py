@@ -4,12 +4,14 @@ import logging
 import random
 
 # --- Internal modules ---
-from services.config import get_valid_config, save_config, DEV_MODE
+from services.config import get_valid_config, save_config, DEV_MODE, PURCHASE_COOLDOWN
 from services.balance import change_balance_userbot
 from services.userbot import get_userbot_client
+from services.userbot_pool import acquire_session, mark_flood, get_pool, PoolSession
+from services.recipients import resolve_recipient, forget_recipient
+from services.negative_cache import mark_failed
 
-from pyrogram import Client
-from pyrogram.types import Message
+from pyrogram import Client, raw
 from pyrogram.errors import (
     FloodWait,
     BadRequest,
@@ -20,6 +22,30 @@ from pyrogram.errors import (
 
 logger = logging.getLogger(__name__)
 
+async def send_gift_to_recipient(
+    client: Client,
+    session_name: str,
+    gift_id: int,
+    target_user_id: int,
+    target_chat_id: str,
+    is_private: bool = True
+):
+    """
+    Sends a gift with the recipient's InputPeer taken from the resolved-peer cache,
+    so no username/peer resolution round trip happens during a purchase.
+    Same calls as Client.send_gift: payments.getPaymentForm + payments.sendStarsForm.
+    """
+    peer = await resolve_recipient(client, session_name, target_user_id, target_chat_id)
+    invoice = raw.types.InputInvoiceStarGift(peer=peer, gift_id=int(gift_id), hide_name=is_private)
+    try:
+        form = await client.invoke(raw.functions.payments.GetPaymentForm(invoice=invoice))
+        return await client.invoke(raw.functions.payments.SendStarsForm(form_id=form.form_id, invoice=invoice))
+    except BadRequest as e:
+        if "PEER_ID_INVALID" in str(e) or "CHANNEL_INVALID" in str(e):
+            forget_recipient(session_name, target_user_id, target_chat_id)
+        raise
+
+
 async def buy_gift_userbot(
     session_user_id: int,
     gift_id: int,
@@ -61,44 +87,60 @@ async def buy_gift_userbot(
 
         return False
 
-    client: Client = await get_userbot_client(session_user_id)
-    if not client:
-        logger.error("Failed to get userbot client object.")
-        return False
-
     for attempt in range(1, retries + 1):
+        pool_session = acquire_session(session_user_id, gift_price)
+        if pool_session:
+            client: Client = pool_session.client
+            session_name = pool_session.session_name
+        else:
+            client: Client = await get_userbot_client(session_user_id)
+            session_name = f"userbot_{session_user_id}"
+        if not client:
+            logger.error("Failed to get userbot client object.")
+            return False
+
         try:
             logger.debug(f"Attempt {attempt}/{retries} to buy gift with userbot...")
 
-            if target_user_id and not target_chat_id:
-                result_send: Message = await client.send_gift(gift_id=int(gift_id), 
-                                                         chat_id=int(target_user_id), 
-                                                         is_private=True)
-            elif target_chat_id and not target_user_id:
-                result_send: Message = await client.send_gift(gift_id=int(gift_id), 
-                                                         chat_id=target_chat_id, 
-                                                         is_private=True)
-            else:
+            if bool(target_user_id) == bool(target_chat_id):
                 logger.warning("Both parameters specified - target_user_id and target_chat_id. Aborting.")
                 break
 
-            new_balance = await change_balance_userbot(-gift_price)
+            await send_gift_to_recipient(client, session_name, gift_id, target_user_id, target_chat_id)
+
+            if pool_session:
+                pool_session.balance -= gift_price
+            try:
+                new_balance = await change_balance_userbot(-gift_price, session_user_id)
+            except Exception as e:
+                logger.error(f"Failed to update userbot balance after purchase: {e}")
+                new_balance = None
             logger.info(f"Successful purchase of gift {gift_id} for {gift_price} stars. Remaining: {new_balance}")
             return True
         
         except FloodWait as e:
-            logger.error(f"Flood wait: waiting for {e.retry_after} seconds")
+            logger.error(f"Flood wait: waiting for {e.value} seconds")
+            if pool_session:
+                mark_flood(pool_session, e.value)
+                if acquire_session(session_user_id, gift_price):
+                    continue  # Another account of the pool can buy right away
             await asyncio.sleep(e.value)
 
         except BadRequest as e:
             if "BALANCE_TOO_LOW" in str(e) or "not enough" in str(e).lower():
                 logger.error(f"Not enough stars: {e}")
+                if pool_session:
+                    pool_session.balance = 0
+                    if acquire_session(session_user_id, gift_price):
+                        continue  # Another account of the pool still has stars
                 return False
             logger.error(f"(BadRequest) Critical error: {e}")
+            mark_failed(gift_id, str(e), target_user_id, target_chat_id)
             return False
 
         except Forbidden as e:
             logger.error(f"(Forbidden) Critical error: {e}")
+            mark_failed(gift_id, str(e), target_user_id, target_chat_id)
             return False
         
         except AuthKeyUnregistered as e:
@@ -116,3 +158,97 @@ async def buy_gift_userbot(
 
     logger.error(f"Failed to buy gift {gift_id} after {retries} attempts.")
     return False
+
+
+async def buy_gifts_userbot_parallel(
+    session_user_id: int,
+    gift_id: int,
+    target_user_id: int,
+    target_chat_id: str,
+    gift_price: int,
+    quantity: int,
+    cooldown: float = PURCHASE_COOLDOWN
+) -> int:
+    """
+    Buys several copies of a gift, spreading the order across all userbot accounts of the user.
+    Every account buys sequentially at its own pace, the accounts work in parallel.
+    An account leaves the order on its first failure; the others keep buying.
+
+    :param session_user_id: Userbot session (tenant) ID
+    :param gift_id: Gift ID
+    :param target_user_id: Recipient user ID (or None)
+    :param target_chat_id: Recipient chat ID (or None)
+    :param gift_price: Gift price in stars
+    :param quantity: Number of gifts to buy
+    :param cooldown: Pause between purchases of one account
+    :return: Number of gifts bought
+    """
+    if quantity <= 0:
+        return 0
+
+    pool = [s for s in get_pool(session_user_id) if s.is_available(gift_price)]
+    if len(pool) <= 1 or quantity == 1 or DEV_MODE:
+        bought = 0
+        while bought < quantity:
+            if not await buy_gift_userbot(session_user_id, gift_id, target_user_id, target_chat_id, gift_price):
+                break
+            bought += 1
+            await asyncio.sleep(cooldown)
+        return bought
+
+    remaining = quantity
+    bought = 0
+
+    async def run(pool_session: PoolSession):
+        nonlocal remaining, bought
+        while remaining > 0 and pool_session.is_available(gift_price):
+            remaining -= 1
+            if not await _send_gift_with_session(pool_session, session_user_id, gift_id, target_user_id, target_chat_id, gift_price):
+                remaining += 1
+                return
+            bought += 1
+            await asyncio.sleep(cooldown)
+
+    await asyncio.gather(*(run(s) for s in pool[:quantity]))
+    logger.info(f"Bought {bought}/{quantity} gifts {gift_id} through {min(len(pool), quantity)} userbot accounts")
+    return bought
+
+
+async def _send_gift_with_session(
+    pool_session: PoolSession,
+    session_user_id: int,
+    gift_id: int,
+    target_user_id: int,
+    target_chat_id: str,
+    gift_price: int
+) -> bool:
+    """
+    Buys one gift through a specific account of the pool, without retries.
+    """
+    if bool(target_user_id) == bool(target_chat_id):
+        logger.warning("Both parameters specified - target_user_id and target_chat_id. Aborting.")
+        return False
+
+    try:
+        await send_gift_to_recipient(pool_session.client, pool_session.session_name, gift_id, target_user_id, target_chat_id)
+    except FloodWait as e:
+        mark_flood(pool_session, e.value)
+        return False
+    except BadRequest as e:
+        if "BALANCE_TOO_LOW" in str(e) or "not enough" in str(e).lower():
+            pool_session.balance = 0
+        else:
+            mark_failed(gift_id, str(e), target_user_id, target_chat_id)
+        logger.error(f"({pool_session.session_name}) Purchase error: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"({pool_session.session_name}) Userbot error during purchase: {e}")
+        return False
+
+    pool_session.balance -= gift_price
+    try:
+        await change_balance_userbot(-gift_price, session_user_id)
+    except Exception as e:
+        logger.error(f"Failed to update userbot balance after purchase: {e}")
+    logger.info(f"({pool_session.session_name}) Successful purchase of gift {gift_id} for {gift_price} stars.")
+    return True
@@ -0,0 +1,394 @@
+# --- Standard libraries ---
+import os
+import json
+import time
+import asyncio
+import logging
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field, replace
+from typing import NamedTuple, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SELECTIONS_LIMIT = 4096  # Memoized windows per catalog content
+BUILT_SNAPSHOTS_LIMIT = 8  # Recently built catalog contents kept for reuse
+VERSIONS_LIMIT = 16  # Recently published catalog versions kept for lookups by version
+
+
+class Gift(NamedTuple):
+    """
+    Normalized gift shared by the bot and userbot sources, the catalog handlers and the worker.
+    A tuple subclass: no per-instance __dict__, immutable, cheap to create and compare.
+
+    :param id: Gift ID
+    :param price: Price in stars
+    :param supply: Total number of gifts (None or 0 for unlimited gifts)
+    :param left: Number of gifts left
+    :param sticker_file_id: file_id of the gift sticker
+    :param emoji: Emoji of the gift sticker
+    """
+    id: Union[int, str]
+    price: int
+    supply: Optional[int]
+    left: Optional[int]
+    sticker_file_id: Optional[str] = None
+    emoji: Optional[str] = None
+
+
+class CatalogIndex:
+    """
+    Search indexes of one catalog content, shared by every snapshot with the same content hash.
+
+    :param gifts: Gift records sorted by price in descending order
+    """
+    __slots__ = ("price_keys", "supply_keys", "supply_positions", "by_id", "selections")
+
+    def __init__(self, gifts: tuple):
+        by_supply = sorted(range(len(gifts)), key=lambda i: gifts[i].supply or 0)
+        self.price_keys = tuple(-g.price for g in gifts)  # -price of gifts[i], ascending
+        self.supply_keys = tuple(gifts[i].supply or 0 for i in by_supply)  # supply, ascending
+        self.supply_positions = tuple(by_supply)  # positions in gifts matching supply_keys
+        self.by_id = {str(g.id): g for g in gifts}  # str(gift id) -> gift
+        self.selections: dict[tuple, tuple] = {}  # (price and supply window) -> selected gifts
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    Immutable view of the gift catalog as seen by one fetch.
+    Gifts are kept sorted by price in descending order, with a secondary index by supply,
+    so price and supply windows are answered with binary search instead of a full scan.
+
+    :param gifts: Gift records sorted by price in descending order
+    :param updated_at: Time of the fetch (time.time())
+    :param source_id: ID of the session the catalog was fetched through
+    :param content_hash: Hash of (id, left, supply, price) of all gifts
+    :param version: Catalog version at the time the snapshot was published (0 if not published)
+    :param stale: True for a snapshot restored from disk that was not confirmed by a fetch yet
+    :param index: Search indexes, built from gifts when not given
+    """
+    gifts: tuple
+    updated_at: float
+    source_id: Optional[int] = None
+    content_hash: int = 0
+    version: int = 0
+    stale: bool = False
+    index: Optional[CatalogIndex] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.index is None:
+            object.__setattr__(self, "index", CatalogIndex(self.gifts))
+
+    def age(self) -> float:
+        """Seconds since the snapshot was fetched."""
+        return time.time() - self.updated_at
+
+    def select(self, min_price: int, max_price: int,
+               min_supply: Optional[int] = None, max_supply: Optional[int] = None) -> list[Gift]:
+        """
+        Returns the gifts within the price window (and the supply window, if given),
+        sorted by price in descending order.
+        The price window is a slice of the snapshot; when the supply window is narrower,
+        it is looked up in the supply index and intersected with the price slice.
+        Results are memoized per window for as long as the catalog content does not change.
+
+        :param min_price: Minimum price
+        :param max_price: Maximum price
+        :param min_supply: Minimum supply (None to ignore supply)
+        :param max_supply: Maximum supply (None to ignore supply)
+        :return: Matching gifts
+        """
+        index = self.index
+        window = (min_price, max_price, min_supply, max_supply)
+        selected = index.selections.get(window)
+        if selected is None:
+            selected = self._select(min_price, max_price, min_supply, max_supply)
+            if len(index.selections) >= CATALOG_SELECTIONS_LIMIT:
+                index.selections.clear()
+            index.selections[window] = selected
+        return list(selected)
+
+    def _select(self, min_price, max_price, min_supply, max_supply) -> tuple:
+        index = self.index
+        lo = bisect_left(index.price_keys, -max_price)
+        hi = bisect_right(index.price_keys, -min_price)
+        if min_supply is None and max_supply is None:
+            return self.gifts[lo:hi]
+
+        min_supply = 0 if min_supply is None else min_supply
+        max_supply = float("inf") if max_supply is None else max_supply
+        supply_lo = bisect_left(index.supply_keys, min_supply)
+        supply_hi = bisect_right(index.supply_keys, max_supply)
+        if hi - lo <= supply_hi - supply_lo:
+            return tuple(g for g in self.gifts[lo:hi] if min_supply <= (g.supply or 0) <= max_supply)
+
+        positions = sorted(p for p in index.supply_positions[supply_lo:supply_hi] if lo <= p < hi)
+        return tuple(self.gifts[p] for p in positions)
+
+
+_built: dict[int, CatalogSnapshot] = {}  # content hash -> last snapshot built with this content
+_snapshots: dict[int, CatalogSnapshot] = {}  # session_id -> latest snapshot
+_versions: dict[int, CatalogSnapshot] = {}  # catalog version -> snapshot published with it
+_catalogs: dict[str, CatalogSnapshot] = {}  # name -> latest snapshot of a shared catalog not bound to a session
+_inflight: dict[str, asyncio.Task] = {}  # fetch key -> shared catalog fetch currently running
+_catalog_version: int = 0  # Incremented every time a catalog with new content is published
+_published_hash: Optional[int] = None  # Content hash of the latest published userbot catalog
+_published_version: int = 0  # Version of the latest published userbot catalog
+
+
+def catalog_hash(gifts) -> int:
+    """
+    Cheap content hash of a catalog over (id, left, supply, price), independent of gift order.
+    """
+    return hash(frozenset((g.id, g.left, g.supply, g.price) for g in gifts))
+
+
+def build_snapshot(gifts, source_id: Optional[int] = None) -> CatalogSnapshot:
+    """
+    Sorts the gifts by price in descending order and builds an indexed snapshot of them.
+    If a catalog with the same content was built recently, its sorted gifts, indexes
+    and memoized selections are reused and only the fetch time is updated
+    (the gifts are compared, so a hash collision never reuses another catalog).
+
+    :param gifts: Gift records in any order
+    :param source_id: ID of the session the catalog was fetched through
+    :return: Snapshot (not published)
+    """
+    gifts = list(gifts)
+    content_hash = catalog_hash(gifts)
+    known = _built.get(content_hash)
+    if known is not None and len(known.gifts) == len(gifts) and set(known.gifts) == set(gifts):
+        return replace(known, updated_at=time.time(), source_id=source_id, stale=False)
+
+    snapshot = CatalogSnapshot(
+        gifts=tuple(sorted(gifts, key=lambda g: g.price, reverse=True)),
+        updated_at=time.time(),
+        source_id=source_id,
+        content_hash=content_hash
+    )
+    if len(_built) >= BUILT_SNAPSHOTS_LIMIT:
+        del _built[next(iter(_built))]
+    _built[content_hash] = snapshot
+    return snapshot
+
+
+def merge_gift_lists(*sources: list[Gift]) -> list[Gift]:
+    """
+    Merges several gift lists into one, deduplicating by gift id.
+    Ids are compared as strings: the Bot API reports them as str, Kurigram as int.
+    For gifts seen by more than one source the smallest "left" wins: stock only ever drains,
+    so the lower value is the fresher one.
+
+    :param sources: Gift lists in order of preference
+    :return: Merged list sorted by price in descending order
+    """
+    merged: dict = {}
+    for gifts in sources:
+        for gift in gifts:
+            key = str(gift.id)
+            known = merged.get(key)
+            if known is None:
+                merged[key] = gift
+                continue
+            if gift.left is not None and (known.left is None or gift.left < known.left):
+                merged[key] = known._replace(left=gift.left)
+
+    result = list(merged.values())
+    result.sort(key=lambda g: g.price, reverse=True)
+    return result
+
+
+def get_catalog_version() -> int:
+    """
+    Returns the latest issued catalog version. Versions only grow, and a catalog gets
+    a new one only when its content changes, so snapshot versions can be used as cache keys.
+    """
+    return _catalog_version
+
+
+def publish_snapshot(session_ids, gifts: list[Gift], source_id: Optional[int] = None) -> CatalogSnapshot:
+    """
+    Publishes a freshly fetched catalog for the given sessions.
+    One snapshot object is shared by all sessions and swapped in atomically, so readers
+    always see either the previous or the new catalog, never a mix.
+    The catalog gets a new version only if its content differs from the previous userbot catalog,
+    otherwise it keeps the previous one (the latest issued version may belong to another catalog).
+
+    :param session_ids: IDs of the sessions that see this catalog
+    :param gifts: Gift records
+    :param source_id: ID of the session the catalog was fetched through
+    :return: Published snapshot
+    """
+    global _catalog_version, _published_hash, _published_version
+    snapshot = build_snapshot(gifts, source_id)
+    if snapshot.content_hash != _published_hash or not _published_version:
+        _catalog_version += 1
+        _published_hash = snapshot.content_hash
+        _published_version = _catalog_version
+        logger.info(f"Gift catalog changed, version {_catalog_version} ({len(snapshot.gifts)} gifts)")
+    snapshot = replace(snapshot, version=_published_version)
+    _remember_version(snapshot)
+    for session_id in session_ids:
+        _snapshots[session_id] = snapshot
+    return snapshot
+
+
+def publish_catalog(name: str, gifts: list[Gift]) -> CatalogSnapshot:
+    """
+    Publishes a catalog that is not bound to a userbot session (e.g. the Bot API catalog shown to users).
+    It gets a new catalog version only when its content differs from its previous snapshot.
+
+    :param name: Name of the catalog
+    :param gifts: Gift records
+    :return: Published snapshot
+    """
+    global _catalog_version
+    snapshot = build_snapshot(gifts)
+    previous = _catalogs.get(name)
+    if previous is not None and previous.content_hash == snapshot.content_hash:
+        version = previous.version
+    else:
+        _catalog_version += 1
+        version = _catalog_version
+    snapshot = replace(snapshot, version=version)
+    _remember_version(snapshot)
+    _catalogs[name] = snapshot
+    return snapshot
+
+
+def _remember_version(snapshot: CatalogSnapshot):
+    """
+    Keeps the snapshot available by its version, evicting the oldest versions.
+    """
+    _versions[snapshot.version] = snapshot
+    while len(_versions) > VERSIONS_LIMIT:
+        del _versions[min(_versions)]
+
+
+def get_catalog_snapshot(version: Optional[int]) -> Optional[CatalogSnapshot]:
+    """
+    Returns the snapshot published with the given version, or None if the version is no longer kept.
+    """
+    return _versions.get(version)
+
+
+def get_catalog_gift(version: int, gift_id) -> Optional[Gift]:
+    """
+    Looks a gift up by id in the catalog published with the given version.
+
+    :param version: Catalog version (e.g. stored in the FSM when the user opened the catalog)
+    :param gift_id: Gift ID
+    :return: Gift or None if the version is no longer kept or has no such gift
+    """
+    snapshot = _versions.get(version)
+    if snapshot is None:
+        return None
+    return snapshot.index.by_id.get(str(gift_id))
+
+
+def get_catalog(name: str) -> Optional[CatalogSnapshot]:
+    """
+    Returns the latest snapshot of a catalog published with publish_catalog().
+    """
+    return _catalogs.get(name)
+
+
+def get_snapshot(session_id: Optional[int] = None) -> Optional[CatalogSnapshot]:
+    """
+    Returns the latest snapshot of the session, or the freshest snapshot of any session.
+
+    :param session_id: Session ID, None for any session
+    :return: Snapshot or None if nothing was fetched yet
+    """
+    if session_id is not None and session_id in _snapshots:
+        return _snapshots[session_id]
+    if not _snapshots:
+        return None
+    return max(_snapshots.values(), key=lambda s: s.updated_at)
+
+
+def is_snapshot_fresh(session_id: Optional[int], max_age: float) -> bool:
+    """
+    Checks that the session (or any session) has a snapshot younger than max_age seconds.
+    A snapshot restored from disk is never fresh until it is refreshed.
+    """
+    snapshot = get_snapshot(session_id)
+    return snapshot is not None and not snapshot.stale and snapshot.age() < max_age
+
+
+def drop_snapshot(session_id: int):
+    """
+    Forgets the snapshot of a stopped or deleted session.
+    """
+    _snapshots.pop(session_id, None)
+
+
+def save_snapshot(snapshot: CatalogSnapshot, path: str):
+    """
+    Writes the snapshot to disk as JSON lines: a header with the fetch time and version,
+    then one line per gift with the Gift fields in order.
+
+    :param snapshot: Snapshot to save
+    :param path: Path of the file
+    """
+    header = {"updated_at": snapshot.updated_at, "version": snapshot.version, "source_id": snapshot.source_id}
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for gift in snapshot.gifts:
+                f.write(json.dumps(list(gift), ensure_ascii=False) + "\n")
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        logger.error(f"Failed to save the gift catalog to {path}: {e}")
+
+
+def restore_snapshot(path: str, session_ids=()) -> Optional[CatalogSnapshot]:
+    """
+    Loads the catalog saved by save_snapshot() and publishes it as stale: filtering and
+    change detection work right after a restart, but the cache is not reported as fresh
+    until the first fetch confirms or replaces it.
+
+    :param path: Path of the file
+    :param session_ids: IDs of the sessions the catalog is published for (the source session is always included)
+    :return: Restored snapshot or None if there is nothing to restore
+    """
+    global _catalog_version, _published_hash, _published_version
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            gifts = [Gift(*json.loads(line)) for line in f if line.strip()]
+    except Exception as e:
+        logger.error(f"Failed to load the gift catalog from {path}: {e}")
+        return None
+
+    snapshot = replace(
+        build_snapshot(gifts, header.get("source_id")),
+        updated_at=header["updated_at"],
+        version=header.get("version", 0),
+        stale=True
+    )
+    _catalog_version = max(_catalog_version, snapshot.version)
+    _published_hash = snapshot.content_hash
+    _published_version = snapshot.version
+    for session_id in {*session_ids, snapshot.source_id} - {None}:
+        _snapshots.setdefault(session_id, snapshot)
+    logger.info(f"Restored gift catalog version {snapshot.version} ({len(gifts)} gifts, {snapshot.age():.0f} seconds old)")
+    return snapshot
+
+
+async def fetch_shared(fetch, key: str = "userbot") -> CatalogSnapshot:
+    """
+    Runs a catalog fetch, deduplicating concurrent requests: while one fetch is running,
+    every other caller awaits the same result instead of starting its own request.
+
+    :param fetch: Coroutine function without arguments returning a CatalogSnapshot
+    :param key: Name of the catalog being fetched (fetches of different catalogs run independently)
+    :return: Snapshot produced by the (shared) fetch
+    """
+    task = _inflight.get(key)
+    if task is None or task.done():
+        task = asyncio.ensure_future(fetch())
+        _inflight[key] = task
+    return await asyncio.shield(task)
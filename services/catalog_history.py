@@ -0,0 +1,180 @@
+# --- Standard libraries ---
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Optional
+
+# --- Internal modules ---
+from services.config import CATALOG_HISTORY_FILE
+from services.userbot import sessions_dir
+
+logger = logging.getLogger(__name__)
+
+# One row per change of "left": (gift_id, ts in milliseconds, left).
+# WITHOUT ROWID keeps the rows clustered by gift and time with no extra index.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    gift_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    left INTEGER NOT NULL,
+    PRIMARY KEY (gift_id, ts)
+) WITHOUT ROWID
+"""
+
+_connection: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()  # The connection is shared by the worker threads of asyncio.to_thread()
+_last_left: dict = {}  # gift_id -> last recorded "left"
+
+
+def _get_connection() -> sqlite3.Connection:
+    """
+    Opens the history database on first use and loads the last recorded stock of every gift.
+    """
+    global _connection
+    if _connection is None:
+        _connection = sqlite3.connect(os.path.join(sessions_dir, CATALOG_HISTORY_FILE), check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("PRAGMA synchronous=NORMAL")
+        _connection.execute(SCHEMA)
+        rows = _connection.execute(
+            "SELECT s.gift_id, s.left FROM stock s "
+            "JOIN (SELECT gift_id, MAX(ts) AS ts FROM stock GROUP BY gift_id) last "
+            "ON s.gift_id = last.gift_id AND s.ts = last.ts"
+        )
+        _last_left.update(rows)
+    return _connection
+
+
+def record_snapshot(snapshot) -> int:
+    """
+    Appends the stock changes of a catalog snapshot to the history.
+    Only gifts whose "left" differs from the last recorded value are written;
+    a limited gift that disappeared from the catalog is recorded as sold out (0).
+
+    :param snapshot: Published CatalogSnapshot
+    :return: Number of recorded changes
+    """
+    try:
+        with _lock:
+            connection = _get_connection()
+            ts = int(snapshot.updated_at * 1000)
+            current = {gift.id: gift.left or 0 for gift in snapshot.gifts if gift.supply}
+            changes = [(gift_id, ts, left) for gift_id, left in current.items() if _last_left.get(gift_id) != left]
+            changes += [(gift_id, ts, 0) for gift_id, left in _last_left.items() if left and gift_id not in current]
+            if not changes:
+                return 0
+
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO stock (gift_id, ts, left) VALUES (?, ?, ?)", changes)
+            for gift_id, _, left in changes:
+                _last_left[gift_id] = left
+            return len(changes)
+    except Exception as e:
+        logger.error(f"Failed to record catalog history: {e}")
+        return 0
+
+
+def get_stock_history(gift_id, since: Optional[float] = None) -> list[tuple[float, int]]:
+    """
+    Returns the recorded stock changes of a gift.
+
+    :param gift_id: Gift ID
+    :param since: Only changes after this time (time.time()), None for the whole history
+    :return: List of (timestamp in seconds, left) in chronological order
+    """
+    since_ms = int(since * 1000) if since is not None else -1
+    with _lock:
+        rows = _get_connection().execute(
+            "SELECT ts, left FROM stock WHERE gift_id = ? AND ts > ? ORDER BY ts",
+            (gift_id, since_ms)
+        ).fetchall()
+    return [(ts / 1000, left) for ts, left in rows]
+
+
+def _rate(start: tuple, end: tuple, now: float) -> float:
+    """
+    Gifts bought per second between two (ts, left) samples, up to now.
+    """
+    elapsed = max(now, end[0]) - start[0]
+    if elapsed <= 0:
+        return 0.0
+    return max(0, start[1] - end[1]) / elapsed
+
+
+def get_drain_rate(gift_id, window: float = 600) -> Optional[float]:
+    """
+    Returns how fast the stock of the gift drained over the last window seconds.
+    The state at the start of the window is the last change before it,
+    since the history only stores changes.
+
+    :param gift_id: Gift ID
+    :param window: Length of the window (in seconds)
+    :return: Gifts per second, or None if the gift has no history
+    """
+    now = time.time()
+    start_ms = int((now - window) * 1000)
+    with _lock:
+        connection = _get_connection()
+        start = connection.execute(
+            "SELECT ts, left FROM stock WHERE gift_id = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+            (gift_id, start_ms)
+        ).fetchone()
+        rows = connection.execute(
+            "SELECT ts, left FROM stock WHERE gift_id = ? AND ts > ? ORDER BY ts",
+            (gift_id, start_ms)
+        ).fetchall()
+    if start is None and not rows:
+        return None
+    if start is not None:
+        start = (max(start[0], start_ms), start[1])
+    else:
+        start = rows[0]
+    end = rows[-1] if rows else start
+    return _rate((start[0] / 1000, start[1]), (end[0] / 1000, end[1]), now)
+
+
+def get_drain_rates(window: float = 600) -> dict:
+    """
+    Returns the drain rate of every gift with a history, fastest first.
+    All gifts are read with one query: the changes inside the window
+    and the last change before it of every gift.
+
+    :param window: Length of the window (in seconds)
+    :return: Dictionary gift_id -> gifts per second
+    """
+    now = time.time()
+    start_ms = int((now - window) * 1000)
+    with _lock:
+        rows = _get_connection().execute(
+            "SELECT gift_id, ts, left FROM stock WHERE ts > ? "
+            "UNION ALL "
+            "SELECT gift_id, MAX(ts), left FROM stock WHERE ts <= ? GROUP BY gift_id "
+            "ORDER BY gift_id, ts",
+            (start_ms, start_ms)
+        ).fetchall()
+
+    rates = {}
+    start = end = None
+    for i, (gift_id, ts, left) in enumerate(rows):
+        if start is None:
+            start = (max(ts, start_ms) / 1000, left)
+        end = (ts / 1000, left)
+        if i + 1 == len(rows) or rows[i + 1][0] != gift_id:
+            rates[gift_id] = _rate(start, end, now)
+            start = None
+    return dict(sorted(rates.items(), key=lambda item: item[1], reverse=True))
+
+
+def prune_history(older_than: float):
+    """
+    Deletes changes older than older_than seconds, keeping the last change of every gift
+    so its current stock stays known.
+    """
+    cutoff_ms = int((time.time() - older_than) * 1000)
+    with _lock, _get_connection() as connection:
+        connection.execute(
+            "DELETE FROM stock WHERE ts < ? AND ts < (SELECT MAX(ts) FROM stock s WHERE s.gift_id = stock.gift_id)",
+            (cutoff_ms,)
+        )
@@ -18,6 +18,40 @@ DEV_MODE = False # Purchase of test gifts
 MAX_PROFILES = 3 # Maximum message length is 4096 characters
 PURCHASE_COOLDOWN = 0.3 # Number of purchases per second
 USERBOT_UPDATE_COOLDOWN = 50 # Base waiting time in seconds for requesting gift list through userbot
+USERBOT_HASH_PROBE_INTERVAL = 3 # Seconds between cheap catalog hash checks through userbot
+USERBOT_START_CONCURRENCY = 10 # Maximum number of userbot sessions logging in simultaneously at startup
+USERBOT_HEALTH_INTERVAL = 15 # Seconds between userbot session health checks
+USERBOT_PING_TIMEOUT = 5 # Seconds to wait for a health check reply before reconnecting
+RECIPIENT_CHECK_TTL = 3600 # Seconds a recipient reachability check stays valid
+CATALOG_SNAPSHOT_FILE = "catalog_snapshot.jsonl" # Last gift catalog, kept in the sessions folder for warm restarts
+CATALOG_RESTORED_MAX_AGE = 600 # Seconds after its fetch the catalog restored from disk may still be used for purchases
+CATALOG_HISTORY_FILE = "catalog_history.sqlite3" # Stock changes of every gift, kept in the sessions folder
+CATALOG_HISTORY_RETENTION = 90 * 24 * 3600 # Seconds stock changes are kept in the history (the last change of a gift is always kept)
+CATALOG_HISTORY_PRUNE_INTERVAL = 3600 # Seconds between deletions of stock changes older than the retention
+CATALOG_DISPLAY_TTL = 10 # Seconds the catalog shown to users is reused before it is fetched again
+CATALOG_PAGE_SIZE = 10 # Gifts per page of the catalog keyboard
+PURCHASE_PRIORITY = "price" # Purchase order of matching gifts: "price" (most expensive first) or "scarcity" (soonest to sell out first)
+SCARCITY_WINDOW = 600 # Seconds of stock history used to estimate how fast a gift sells out
+OUTBOUND_GLOBAL_RATE = 30 # Messages per second the bot sends in total (Telegram limit is about 30)
+OUTBOUND_CHAT_RATE = 1 # Messages per second to one private chat
+OUTBOUND_GROUP_RATE = 20 / 60 # Messages per second to one group or channel (Telegram limit is about 20 per minute)
+OUTBOUND_CHAT_BURST = 3 # Messages a chat can receive at once before its rate applies
+FSM_STORAGE_FILE = "fsm_state.sqlite3" # Wizard and catalog FSM state, kept in the sessions folder
+FSM_STATE_TTL = 24 * 3600 # Seconds an unfinished FSM flow is kept after its last step
+RATE_LIMIT_MAX_KEYS = 100000 # (user, command) rate limit buckets kept in memory at most
+# Minimum seconds between calls of a command or button by one user (buttons by callback route name)
+RATE_LIMITS = {
+    "/start": 1,
+    "catalog": 3,
+    "buy_test_gift": 5,
+    "confirm_purchase": 3
+}
+# Seconds a hard purchase failure is remembered, by failure class ("sold_out" is also released on restock)
+NEGATIVE_CACHE_TTL = {
+    "sold_out": 86400,
+    "not_purchasable": 600,
+    "recipient": 120
+}
 
 def add_allowed_user(user_id):
     # В публичном режиме эта функция ничего не делает
@@ -123,18 +157,21 @@ async def save_config(config: dict):
     
     logger.info(f"Configuration saved in Supabase.")
 
-async def format_supabase_summary(user_id: int) -> str:
+async def format_supabase_summary(user_id: int, snapshot: Optional[dict] = None) -> str:
     """
-    Форматирует текст меню из данных Supabase
+    Форматирует текст меню из данных Supabase.
+    Данные берутся из готового снимка (см. get_menu_snapshot), иначе загружаются одним параллельным запросом.
+    """
+    if snapshot is None:
+        from services.database import get_menu_snapshot
+        snapshot = await get_menu_snapshot(user_id)
+    return render_menu_summary(user_id, snapshot["user"], snapshot["profiles"], snapshot["userbot"])
+
+
+def render_menu_summary(user_id: int, user_data: dict, profiles: list, userbot_data: Optional[dict]) -> str:
+    """
+    Формирует текст меню из уже загруженных данных.
     """
-    # Получаем данные пользователя и профили
-    user_data = await get_user_data(user_id)
-    profiles = await get_user_profiles(user_id)
-    
-    # Получаем данные юзербота из отдельной таблицы
-    from services.database import get_user_userbot_data
-    userbot_data = await get_user_userbot_data(user_id)
-    
     # Получаем основные данные
     balance = user_data.get("balance", 0)
     active = user_data.get("active", False)
@@ -1,5 +1,6 @@
 # --- Standard libraries ---
 import os
+import asyncio
 import logging
 from typing import Dict, Any, Optional, List, Union
 
@@ -270,20 +271,55 @@ async def get_user_userbot_data(user_id: int) -> Union[Dict[str, Any], None]:
             # Если записи нет, возвращаем None
             return None
         
-        userbot_data = response.data[0]
-        return {
-            "api_id": userbot_data.get("api_id"),
-            "api_hash": userbot_data.get("api_hash"),
-            "phone": userbot_data.get("phone"),
-            "user_id": userbot_data.get("user_id"),
-            "username": userbot_data.get("username"),
-            "balance": 0,  # Баланс юзербота хранится в таблице users
-            "enabled": userbot_data.get("enabled", False)
-        }
+        return _format_userbot_data(response.data[0])
     except Exception as e:
         logger.error(f"Ошибка при получении данных юзербота пользователя: {e}")
         return None
 
+def _format_userbot_data(userbot_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Приводит строку таблицы userbots к формату данных юзербота.
+    """
+    return {
+        "api_id": userbot_data.get("api_id"),
+        "api_hash": userbot_data.get("api_hash"),
+        "phone": userbot_data.get("phone"),
+        "user_id": userbot_data.get("user_id"),
+        "username": userbot_data.get("username"),
+        "balance": 0,  # Баланс юзербота хранится в таблице users
+        "enabled": userbot_data.get("enabled", False)
+    }
+
+async def get_menu_snapshot(user_id: int) -> Dict[str, Any]:
+    """
+    Получение всех данных для меню одним параллельным запросом:
+    пользователь, его профили и данные юзербота.
+    Три запроса к Supabase выполняются одновременно в потоках (клиент синхронный).
+    Если пользователя или профилей ещё нет, они создаются через обычные функции.
+
+    Returns:
+        {"user": данные пользователя, "profiles": список профилей, "userbot": данные юзербота или None}
+    """
+    try:
+        supabase = get_supabase_client()
+        users, profiles, userbots = await asyncio.gather(
+            asyncio.to_thread(supabase.table("users").select("*").eq("user_id", user_id).execute),
+            asyncio.to_thread(supabase.table("profiles").select("*").eq("user_id", user_id).execute),
+            asyncio.to_thread(supabase.table("userbots").select("*").eq("user_id", user_id).execute)
+        )
+        return {
+            "user": users.data[0] if users.data else await get_user_data(user_id),
+            "profiles": profiles.data if profiles.data else await get_user_profiles(user_id),
+            "userbot": _format_userbot_data(userbots.data[0]) if userbots.data else None
+        }
+    except Exception as e:
+        logger.error(f"Ошибка при получении данных меню: {e}")
+        return {
+            "user": await get_user_data(user_id),
+            "profiles": await get_user_profiles(user_id),
+            "userbot": await get_user_userbot_data(user_id)
+        }
+
 async def update_user_userbot_data(user_id: int, data: Dict[str, Any]) -> Union[Dict[str, Any], None]:
     """
     Обновление данных юзербота пользователя в таблице userbots.
@@ -325,4 +361,23 @@ async def update_user_userbot_data(user_id: int, data: Dict[str, Any]) -> Union[
         return None
     except Exception as e:
         logger.error(f"Ошибка при обновлении данных юзербота пользователя: {e}")
-        return None 
\ No newline at end of file
+        return None
+
+async def get_userbot_owner_ids() -> List[int]:
+    """
+    Получение user_id всех пользователей с настроенным юзерботом.
+    """
+    try:
+        supabase = get_supabase_client()
+        
+        # Берем только записи с заполненными данными для входа
+        response = (supabase.table("userbots").select("user_id")
+                    .not_.is_("api_id", "null")
+                    .not_.is_("api_hash", "null")
+                    .not_.is_("phone", "null")
+                    .execute())
+        
+        return [row["user_id"] for row in response.data]
+    except Exception as e:
+        logger.error(f"Ошибка при получении списка юзерботов: {e}")
+        return []
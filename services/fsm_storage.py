@@ -0,0 +1,133 @@
+# --- Standard libraries ---
+import os
+import time
+import pickle
+import sqlite3
+import logging
+from typing import Any, Mapping, Optional
+
+# --- Third-party libraries ---
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+
+# --- Internal modules ---
+from services.config import FSM_STORAGE_FILE, FSM_STATE_TTL
+from services.userbot import sessions_dir
+from services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# One row per FSM context: state name and pickled data, dropped after expires_at (unix seconds).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data BLOB,
+    expires_at INTEGER NOT NULL
+) WITHOUT ROWID
+"""
+
+PRUNE_INTERVAL = 3600  # Seconds between deletions of expired rows
+
+
+def _storage_key(key: StorageKey) -> str:
+    return (f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+            f"{key.business_connection_id or ''}:{key.destiny}")
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM storage in a local SQLite file: wizard and catalog flows survive a restart.
+    Data is pickled; every context expires `ttl` seconds after its last change, so abandoned flows are dropped.
+    Existing rows are cached in memory after the first read, so a state.update_data() costs one write and no reads;
+    missing and deleted contexts are not cached.
+    """
+    def __init__(self, path: Optional[str] = None, ttl: int = FSM_STATE_TTL):
+        """
+        :param path: Database file (sessions/fsm_state.sqlite3 by default)
+        :param ttl: Seconds a context is kept after its last change
+        """
+        self.ttl = ttl
+        self.connection = sqlite3.connect(path or os.path.join(sessions_dir, FSM_STORAGE_FILE))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(SCHEMA)
+        self.rows: dict[str, tuple] = {}  # key -> (state, pickled data, expires_at)
+        self.pruned_at = 0.0
+        self._prune()
+
+    def _read(self, key: str) -> tuple:
+        row = self.rows.get(key)
+        if row is None:
+            row = self.connection.execute(
+                "SELECT state, data, expires_at FROM fsm WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, None, 0
+            self.rows[key] = row
+        if row[2] < time.time():
+            return None, None, 0
+        return row
+
+    def _write(self, key: str, state: Optional[str], data: Optional[bytes]):
+        if state is None and data is None:
+            self.rows.pop(key, None)
+            self.connection.execute("DELETE FROM fsm WHERE key = ?", (key,))
+        else:
+            now = time.time()
+            expires_at = int(now + self.ttl)
+            self.rows[key] = (state, data, expires_at)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO fsm (key, state, data, expires_at) VALUES (?, ?, ?, ?)",
+                (key, state, data, expires_at)
+            )
+            if now - self.pruned_at > PRUNE_INTERVAL:
+                self._prune()
+        self.connection.commit()
+
+    def _prune(self):
+        """
+        Deletes the contexts that were not changed for longer than the TTL.
+        """
+        now = time.time()
+        self.pruned_at = now
+        deleted = self.connection.execute("DELETE FROM fsm WHERE expires_at < ?", (int(now),)).rowcount
+        self.connection.commit()
+        self.rows = {k: row for k, row in self.rows.items() if row[2] >= now}
+        if deleted:
+            logger.info(f"Dropped {deleted} expired FSM contexts")
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = _storage_key(key)
+        _, data, _ = self._read(k)
+        self._write(k, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._read(_storage_key(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        k = _storage_key(key)
+        state, _, _ = self._read(k)
+        self._write(k, state, pickle.dumps(dict(data), protocol=pickle.HIGHEST_PROTOCOL) if data else None)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        data = self._read(_storage_key(key))[1]
+        return pickle.loads(data) if data else {}
+
+    async def close(self) -> None:
+        self.connection.close()
+
+
+def create_fsm_storage(redis_url: Optional[str] = None) -> BaseStorage:
+    """
+    Creates the FSM storage of the dispatcher.
+    Redis is used when a URL is given and the redis package is installed (state shared between bot replicas),
+    otherwise the local SQLite storage.
+
+    :param redis_url: Redis connection URL, e.g. redis://localhost:6379/0
+    """
+    redis = get_redis_client(redis_url)
+    if redis is not None:
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage(redis, state_ttl=FSM_STATE_TTL, data_ttl=FSM_STATE_TTL)
+    return SQLiteStorage()
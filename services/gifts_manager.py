@@ -1,60 +1,217 @@
 # --- Standard libraries ---
+import os
 import time
 import random
 import asyncio
 import logging
+from typing import Optional
 
 # --- Internal modules ---
-from services.config import USERBOT_UPDATE_COOLDOWN
+from services.config import (
+    USERBOT_UPDATE_COOLDOWN, USERBOT_HASH_PROBE_INTERVAL, CATALOG_SNAPSHOT_FILE, CATALOG_DISPLAY_TTL,
+    CATALOG_HISTORY_RETENTION, CATALOG_HISTORY_PRUNE_INTERVAL, CATALOG_RESTORED_MAX_AGE
+)
 from services.gifts_bot import get_filtered_gifts
-from services.gifts_userbot import get_userbot_filtered_gifts
+from services.gifts_userbot import get_userbot_filtered_gifts, probe_userbot_catalog_hash, subscribe_catalog_updates
+from services.userbot import get_active_userbot_ids, sessions_dir
+from services.negative_cache import release_restocked
+from services.catalog_history import record_snapshot, prune_history
+from services.catalog import (
+    Gift, CatalogSnapshot, publish_snapshot, get_snapshot, is_snapshot_fresh, fetch_shared,
+    save_snapshot, restore_snapshot, publish_catalog, get_catalog, merge_gift_lists
+)
 
 logger = logging.getLogger(__name__)
 
-userbot_all_gifts: list[dict] = []
-last_update_userbot: float = 0
+_catalog_changed: asyncio.Event = None
+_rotation: int = 0  # Round-robin offset of the session used for the next shared fetch
+_saved_version: Optional[int] = None  # Catalog version last written to disk
+_stale_logged_version: Optional[int] = None  # Restored catalog version already reported as used
+_history_pruned_at: float = 0.0  # Time the stock history was last pruned
 
-async def userbot_gifts_updater(user_id: int, base_interval: int = USERBOT_UPDATE_COOLDOWN):
+def _get_catalog_event() -> asyncio.Event:
     """
-    Starts a background task for regular updating of the userbot gifts cache.
+    Returns the event that wakes up the userbot updater (created lazily inside the running loop).
+    """
+    global _catalog_changed
+    if _catalog_changed is None:
+        _catalog_changed = asyncio.Event()
+    return _catalog_changed
 
-    :param user_id: Telegram ID of the userbot session owner
-    :param base_interval: Minimum update interval (in seconds);
-                          actual pause will be from base_interval to base_interval + 10
+
+def notify_catalog_changed():
     """
-    global userbot_all_gifts, last_update_userbot
-    while True:
-        try:
-            userbot_all_gifts = await get_userbot_filtered_gifts(
-                user_id,
+    Requests an immediate refresh of the userbot gifts cache.
+    """
+    _get_catalog_event().set()
+
+
+async def refresh_userbot_catalog() -> Optional[CatalogSnapshot]:
+    """
+    Fetches the gift catalog once through one of the active userbot sessions
+    and publishes it for all of them. Concurrent callers share a single request.
+
+    :return: Published snapshot or None if no session could fetch the catalog
+    """
+    async def fetch():
+        global _rotation, _saved_version
+        session_ids = get_active_userbot_ids()
+        if not session_ids:
+            return None
+        _rotation = (_rotation + 1) % len(session_ids)
+        for session_id in session_ids[_rotation:] + session_ids[:_rotation]:
+            gifts = await get_userbot_filtered_gifts(
+                session_id,
                 min_price=1,
                 max_price=10000000,
                 min_supply=1,
                 max_supply=100000000,
                 unlimited=False
             )
-            last_update_userbot = time.time()
+            if gifts:
+                snapshot = publish_snapshot(get_active_userbot_ids(), gifts, source_id=session_id)
+                release_restocked(snapshot.gifts, snapshot.updated_at)
+                if snapshot.version != _saved_version:
+                    # An unchanged catalog keeps its version: nothing new to save or record
+                    _saved_version = snapshot.version
+                    await asyncio.to_thread(record_snapshot, snapshot)
+                    await asyncio.to_thread(save_snapshot, snapshot, _catalog_path())
+                return snapshot
+        return None
+
+    return await fetch_shared(fetch)
+
+
+async def get_display_catalog(bot, max_age: float = CATALOG_DISPLAY_TTL) -> CatalogSnapshot:
+    """
+    Returns the full Bot API catalog shown to users in the gift catalog.
+    The snapshot is shared by all users and reused while it is younger than max_age,
+    so opening the catalog and browsing its pages does not hit the API every time.
+
+    :param bot: aiogram bot object
+    :param max_age: Maximum age of the cached catalog (in seconds)
+    :return: Snapshot of the catalog (its version changes only when the content changes)
+    """
+    snapshot = get_catalog("bot")
+    if snapshot is not None and snapshot.age() < max_age:
+        return snapshot
+
+    async def fetch():
+        fetched_at = time.time()
+        gifts = await get_filtered_gifts(
+            bot=bot,
+            min_price=0,
+            max_price=1000000,
+            min_supply=0,
+            max_supply=100000000,
+            unlimited=True
+        )
+        release_restocked(gifts, fetched_at)
+        return publish_catalog("bot", gifts)
+
+    return await fetch_shared(fetch, key="bot")
+
+
+def _catalog_path() -> str:
+    """
+    Path of the file the last userbot catalog is saved to.
+    """
+    return os.path.join(sessions_dir, CATALOG_SNAPSHOT_FILE)
+
+
+def restore_userbot_catalog() -> Optional[CatalogSnapshot]:
+    """
+    Loads the catalog saved before the restart for all active userbot sessions.
+    It is marked as stale, so is_userbot_cache_fresh() stays False until the first refresh,
+    but the purchase worker filters it until then.
+
+    :return: Restored snapshot or None
+    """
+    global _saved_version
+    snapshot = restore_snapshot(_catalog_path(), get_active_userbot_ids())
+    if snapshot is not None:
+        _saved_version = snapshot.version
+    return snapshot
+
+
+async def userbot_gifts_updater(base_interval: int = USERBOT_UPDATE_COOLDOWN):
+    """
+    Starts a background task for updating the userbot gifts cache of all active sessions.
+    The cache is refreshed immediately when a catalog change is pushed by Telegram
+    or detected by the hash watcher; otherwise it is refreshed by slow polling as a fallback.
+
+    :param base_interval: Minimum fallback update interval (in seconds);
+                          actual pause will be from base_interval to base_interval + 10
+    """
+    event = _get_catalog_event()
+    asyncio.create_task(userbot_catalog_watcher())
+    while True:
+        try:
+            for session_id in get_active_userbot_ids():
+                await subscribe_catalog_updates(session_id, notify_catalog_changed)
+            event.clear()
+            await refresh_userbot_catalog()
+            await prune_catalog_history()
         except Exception as e:
             logger.error(f"Error in userbot_gifts_updater: {e}")
         delay = random.randint(base_interval, base_interval + 10)
-        await asyncio.sleep(delay)
+        try:
+            await asyncio.wait_for(event.wait(), timeout=delay)
+            logger.info("Gift catalog change detected, refreshing userbot cache.")
+        except asyncio.TimeoutError:
+            pass
+
+
+async def prune_catalog_history(retention: float = CATALOG_HISTORY_RETENTION,
+                                 interval: float = CATALOG_HISTORY_PRUNE_INTERVAL):
+    """
+    Deletes stock changes older than the retention from the catalog history, at most once per interval.
+
+    :param retention: Seconds stock changes are kept
+    :param interval: Minimum pause between deletions (in seconds)
+    """
+    global _history_pruned_at
+    now = time.time()
+    if now - _history_pruned_at < interval:
+        return
+    _history_pruned_at = now
+    await asyncio.to_thread(prune_history, retention)
+
 
+async def userbot_catalog_watcher(interval: float = USERBOT_HASH_PROBE_INTERVAL):
+    """
+    Cheaply checks the catalog hash through one active userbot session
+    and wakes up the updater when it changes.
 
-def is_userbot_cache_fresh(max_age: int = USERBOT_UPDATE_COOLDOWN + 10) -> bool:
+    :param interval: Pause between hash checks (in seconds)
+    """
+    while True:
+        try:
+            session_ids = get_active_userbot_ids()
+            if session_ids and await probe_userbot_catalog_hash(session_ids[0]):
+                notify_catalog_changed()
+        except Exception as e:
+            logger.error(f"Error in userbot_catalog_watcher: {e}")
+        await asyncio.sleep(interval)
+
+
+def is_userbot_cache_fresh(max_age: int = USERBOT_UPDATE_COOLDOWN + 10, session_id: int = None) -> bool:
     """
     Checks if the userbot cache is up-to-date.
 
     :param max_age: Maximum allowed time since the last update (in seconds)
+    :param session_id: Userbot session ID, None for any session
     :return: True if the cache is fresh
     """
-    return time.time() - last_update_userbot < max_age
+    return is_snapshot_fresh(session_id, max_age)
 
 
-def filter_gifts_by_profile(gifts: list[dict], profile: dict) -> list[dict]:
+def filter_gifts_by_profile(gifts, profile: dict) -> list[Gift]:
     """
     Filters the list of gifts according to the parameters of a specific profile.
+    A CatalogSnapshot is answered from its price and supply indexes without scanning it.
 
-    :param gifts: List of all available gifts (dictionaries)
+    :param gifts: CatalogSnapshot or list of all available gifts (Gift records)
     :param profile: Dictionary with profile parameters (price range, limits)
     :return: Filtered list of gifts suitable for the profile
     """
@@ -62,45 +219,87 @@ def filter_gifts_by_profile(gifts: list[dict], profile: dict) -> list[dict]:
     max_price = profile.get("max_price", profile.get("MAX_PRICE", 10000))
     min_supply = profile.get("min_supply", profile.get("MIN_SUPPLY", 0))
     max_supply = profile.get("max_supply", profile.get("MAX_SUPPLY", 10000))
-    
+
+    if isinstance(gifts, CatalogSnapshot):
+        return gifts.select(min_price, max_price, min_supply, max_supply)
     return [
         g for g in gifts
-        if min_price <= g.get("price", 0) <= max_price
-        and min_supply <= g.get("supply", 0) <= max_supply
+        if min_price <= g.price <= max_price
+        and min_supply <= (g.supply or 0) <= max_supply
     ]
 
 
-async def get_best_gift_list(bot, profile: dict) -> list[dict]:
+async def _fetch_bot_gifts(bot, profile: dict) -> list[Gift]:
     """
-    Returns the most complete list of gifts - either from the bot or from the userbot,
-    depending on where there are more gifts, subject to filtering by profile.
-
-    :param bot: aiogram bot object
-    :param profile: Dictionary with profile parameters (filtering by price, quantity, etc.)
-    :return: Filtered list of gifts (as list[dict])
+    Gets the gift list for the profile through the Bot API.
     """
-    global userbot_all_gifts
-
     min_price = profile.get("min_price", profile.get("MIN_PRICE", 0))
     max_price = profile.get("max_price", profile.get("MAX_PRICE", 10000))
     min_supply = profile.get("min_supply", profile.get("MIN_SUPPLY", 0))
     max_supply = profile.get("max_supply", profile.get("MAX_SUPPLY", 10000))
 
     try:
-        gifts_bot = await get_filtered_gifts(
+        fetched_at = time.time()
+        gifts = await get_filtered_gifts(
             bot,
             min_price,
             max_price,
             min_supply,
             max_supply
         )
+        release_restocked(gifts, fetched_at)
+        return gifts
     except Exception as e:
         logger.error(f"Error getting gift list from bot: {e}")
-        gifts_bot = []
+        return []
+
+
+async def _fetch_userbot_gifts(user_id: int, profile: dict) -> list[Gift]:
+    """
+    Gets the gift list for the profile from the userbot catalog snapshot.
+    The snapshot is kept up to date by userbot_gifts_updater (on catalog changes and by slow polling);
+    the catalog is fetched live only when the snapshot is missing or expired, and that fetch is shared
+    with every concurrent caller. Until the first fetch succeeds after a restart, the catalog restored
+    from disk is used, as long as it is not older than CATALOG_RESTORED_MAX_AGE.
+    """
+    global _stale_logged_version
+    if is_userbot_cache_fresh(session_id=user_id):
+        return filter_gifts_by_profile(get_snapshot(user_id), profile)
+
+    if get_active_userbot_ids():
+        try:
+            snapshot = await refresh_userbot_catalog()
+            if snapshot:
+                return filter_gifts_by_profile(snapshot, profile)
+        except Exception as e:
+            logger.error(f"Error getting gift list from userbot: {e}")
+
+    snapshot = get_snapshot(user_id)
+    if snapshot is not None and snapshot.stale and snapshot.age() <= CATALOG_RESTORED_MAX_AGE:
+        if _stale_logged_version != snapshot.version:
+            _stale_logged_version = snapshot.version
+            logger.warning(f"Using the gift catalog restored from disk (version {snapshot.version}, "
+                           f"{snapshot.age():.0f} seconds old) until the first userbot fetch")
+        return filter_gifts_by_profile(snapshot, profile)
+    return []
+
+
+async def get_best_gift_list(bot, profile: dict, user_id: int = None) -> list[Gift]:
+    """
+    Returns the merged list of gifts from the bot and the userbot, subject to filtering by profile.
+    Both sources are queried concurrently, so a new drop is seen as soon as either of them sees it.
+
+    :param bot: aiogram bot object
+    :param profile: Dictionary with profile parameters (filtering by price, quantity, etc.)
+    :param user_id: Telegram ID of the userbot session owner (defaults to the profile owner)
+    :return: Filtered list of gifts (as list[Gift])
+    """
+    if user_id is None:
+        user_id = profile.get("user_id")
 
-    gifts_userbot = filter_gifts_by_profile(userbot_all_gifts, profile)
+    gifts_bot, gifts_userbot = await asyncio.gather(
+        _fetch_bot_gifts(bot, profile),
+        _fetch_userbot_gifts(user_id, profile)
+    )
 
-    if is_userbot_cache_fresh() and len(gifts_userbot) > len(gifts_bot):
-        return gifts_userbot
-    
-    return gifts_bot
+    return merge_gift_lists(gifts_bot, gifts_userbot)
@@ -2,27 +2,36 @@
 import logging
 
 # --- Third-party libraries ---
-from pyrogram.types import Gift
+from pyrogram import raw
+from pyrogram.handlers import RawUpdateHandler
+from pyrogram.types import Gift as PyrogramGift
 
 # --- Internal modules ---
 from utils.mockdata import generate_test_gifts
 from services.config import DEV_MODE, get_valid_config
 from services.userbot import get_userbot_client, is_userbot_active
+from services.catalog import Gift, build_snapshot
 
 logger = logging.getLogger(__name__)
 
-def normalize_gift(gift: Gift) -> dict:
+# Raw MTProto updates whose class name contains one of these markers may mean the gift catalog changed
+CATALOG_UPDATE_MARKERS = ("StarGift", "UpdateConfig")
+
+_catalog_hashes: dict[int, int] = {}  # user_id -> last seen payments.getStarGifts hash
+_subscribed_clients: dict[int, object] = {}  # user_id -> Client with the raw handler attached
+
+def normalize_gift(gift: PyrogramGift) -> Gift:
     """
-    Converts a Gift object from Pyrogram to a dictionary with key gift characteristics.
+    Converts a Gift object from Pyrogram to a Gift record with key gift characteristics.
     """
-    return {
-        "id": gift.id,
-        "price": gift.price or 0,
-        "supply": gift.total_amount or 0,
-        "left": gift.available_amount or 0,
-        "sticker_file_id": getattr(gift.sticker, "file_id", None),
-        "emoji": getattr(gift.sticker, "emoji", None)
-    }
+    return Gift(
+        id=gift.id,
+        price=gift.price or 0,
+        supply=gift.total_amount or 0,
+        left=gift.available_amount or 0,
+        sticker_file_id=getattr(gift.sticker, "file_id", None),
+        emoji=getattr(gift.sticker, "emoji", None)
+    )
 
 
 async def get_userbot_filtered_gifts(
@@ -34,7 +43,7 @@ async def get_userbot_filtered_gifts(
     unlimited: bool = False,
     add_test_gifts: bool = False,
     test_gifts_count: int = 5
-) -> list[dict]:
+) -> list[Gift]:
     """
     Gets a list of gifts through Pyrogram userbot and filters them by specified parameters.
     Returns an empty list if the session is not active or disabled in the config.
@@ -51,36 +60,77 @@ async def get_userbot_filtered_gifts(
             return []
         
         userbot = await get_userbot_client(user_id)
-        gifts: list[Gift] = await userbot.get_available_gifts()
+        gifts: list[PyrogramGift] = await userbot.get_available_gifts()
     except Exception as e:
         logger.error(f"Error getting gifts from userbot: {e}")
         return []
     
-    filtered = []
-    for gift in gifts:
-        price = gift.price or 0
-        supply = gift.total_amount or 0
+    available = [normalize_gift(gift) for gift in gifts if not gift.is_sold_out]
 
-        if gift.is_sold_out: continue
+    if add_test_gifts or DEV_MODE:
+        available += generate_test_gifts(test_gifts_count)
 
-        price_ok = min_price <= price <= max_price
-        supply_ok = min_supply <= supply <= max_supply
+    # Sort once and cut the price window out of the snapshot
+    snapshot = build_snapshot(available)
+    if not unlimited:
+        return snapshot.select(min_price, max_price, min_supply, max_supply)
+    # Unlimited gifts (supply 0) pass regardless of the supply window
+    return [
+        g for g in snapshot.select(min_price, max_price)
+        if not g.supply or min_supply <= g.supply <= max_supply
+    ]
 
-        if unlimited and gift.is_limited == False:
-            supply_ok = True
 
-        if price_ok and supply_ok:
-            filtered.append(normalize_gift(gift))
+async def probe_userbot_catalog_hash(user_id: int) -> bool:
+    """
+    Asks Telegram whether the gift catalog changed since the last seen hash.
+    The request is answered with a tiny "not modified" stub while the catalog is the same.
 
-    if add_test_gifts or DEV_MODE:
-        test_gifts = generate_test_gifts(test_gifts_count)
-        test_filtered = [
-            g for g in test_gifts
-            if min_price <= g["price"] <= max_price and (
-                unlimited or min_supply <= g["supply"] <= max_supply
-            )
-        ]
-        filtered += test_filtered
-
-    filtered.sort(key=lambda g: g["price"], reverse=True)
-    return filtered
\ No newline at end of file
+    :param user_id: Telegram ID of the userbot session owner
+    :return: True if the catalog hash changed
+    """
+    if not is_userbot_active(user_id):
+        return False
+
+    userbot = await get_userbot_client(user_id)
+    if not userbot:
+        return False
+
+    known_hash = _catalog_hashes.get(user_id, 0)
+    result = await userbot.invoke(raw.functions.payments.GetStarGifts(hash=known_hash))
+    if isinstance(result, raw.types.payments.StarGiftsNotModified):
+        return False
+
+    _catalog_hashes[user_id] = result.hash
+    # The very first probe only establishes the baseline
+    return known_hash != 0 and result.hash != known_hash
+
+
+async def subscribe_catalog_updates(user_id: int, on_change) -> bool:
+    """
+    Attaches a raw update handler to the userbot session that calls on_change()
+    whenever Telegram pushes a gift-related update.
+
+    :param user_id: Telegram ID of the userbot session owner
+    :param on_change: Callable without arguments invoked on a relevant update
+    :return: True if the session is subscribed
+    """
+    if not is_userbot_active(user_id):
+        return False
+
+    userbot = await get_userbot_client(user_id)
+    if not userbot:
+        return False
+    if _subscribed_clients.get(user_id) is userbot:
+        return True
+
+    async def on_raw_update(client, update, users, chats):
+        name = type(update).__name__
+        if any(marker in name for marker in CATALOG_UPDATE_MARKERS):
+            logger.debug(f"Catalog-related update received: {name}")
+            on_change()
+
+    userbot.add_handler(RawUpdateHandler(on_raw_update), group=-1)
+    _subscribed_clients[user_id] = userbot
+    logger.info("Userbot subscribed to gift catalog updates.")
+    return True
\ No newline at end of file
@@ -1,21 +1,56 @@
+# --- Standard libraries ---
+import hashlib
+from contextvars import ContextVar
+from typing import Optional
+
 # --- Third-party libraries ---
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import Optional
 
 # --- Internal modules ---
 from services.config import format_supabase_summary
-from services.database import get_user_data, update_user_data
+from services.database import get_user_data, update_user_data, get_menu_snapshot
+
+# chat_id -> [id of the menu message, hash of its rendered text and keyboard (None if unknown)]
+_menus: dict[int, list] = {}
+# True while update_menu itself edits the menu (such edits must not reset the hash)
+_rendering_menu: ContextVar[bool] = ContextVar("rendering_menu", default=False)
+
+
+def _menu_digest(text: str, markup: InlineKeyboardMarkup) -> str:
+    """
+    Hash of the rendered menu: text and keyboard.
+    """
+    return hashlib.blake2b((text + markup.model_dump_json()).encode(), digest_size=16).hexdigest()
+
+
+def forget_menu_render(chat_id: int, message_id: int, deleted: bool = False):
+    """
+    Called for every edit or deletion of a message by the bot: if another handler changed
+    the menu message, its stored hash no longer matches what the user sees.
+    """
+    menu = _menus.get(chat_id)
+    if menu is None or menu[0] != message_id or _rendering_menu.get():
+        return
+    if deleted:
+        del _menus[chat_id]
+    else:
+        menu[1] = None
+
 
-async def update_last_menu_message_id(message_id: int, user_id: int):
+async def update_last_menu_message_id(message_id: int, user_id: int, chat_id: int = None, digest: str = None):
     """
     Сохраняет id последнего сообщения с меню.
     
     Args:
         message_id: ID сообщения
         user_id: ID пользователя
+        chat_id: ID чата (для кэша в памяти, опционально)
+        digest: Хэш отрисованного меню (опционально)
     """
+    if chat_id is not None:
+        _menus[chat_id] = [message_id, digest]
     await update_user_data(user_id, {"last_menu_message_id": message_id})
 
 
@@ -60,17 +95,54 @@ def config_action_keyboard(active: bool) -> InlineKeyboardMarkup:
 
 async def update_menu(bot, chat_id: int, user_id: int, message_id: int):
     """
-    Обновляет меню в чате: удаляет предыдущее и отправляет новое.
+    Обновляет меню в чате. Если действие пришло из самого меню, сообщение редактируется на месте,
+    а если текст и клавиатура не изменились — запрос не отправляется вовсе.
+    Иначе удаляет предыдущее меню и отправляет новое.
     """
-    # Получаем данные пользователя из Supabase
-    user_data = await get_user_data(user_id)
+    # Получаем все данные меню одним параллельным запросом
+    snapshot = await get_menu_snapshot(user_id)
+    user_data = snapshot["user"]
     active = user_data.get("active", False)
     
-    # Формируем текст меню из данных Supabase
-    menu_text = await format_supabase_summary(user_id)
-    
+    # Формируем текст меню из снимка
+    menu_text = await format_supabase_summary(user_id, snapshot)
+    markup = config_action_keyboard(active)
+    digest = _menu_digest(menu_text, markup)
+
+    if chat_id not in _menus:
+        last_menu_message_id = user_data.get("last_menu_message_id")
+        if last_menu_message_id:
+            _menus[chat_id] = [last_menu_message_id, None]
+
+    menu = _menus.get(chat_id)
+    if menu is not None and menu[0] == message_id:
+        if menu[1] == digest:
+            return
+        if await edit_menu(bot, chat_id, message_id, menu_text, markup):
+            menu[1] = digest
+            return
+
     await delete_menu(bot=bot, chat_id=chat_id, user_id=user_id, current_message_id=message_id)
-    await send_menu(bot=bot, chat_id=chat_id, text=menu_text, active=active, user_id=user_id)
+    await send_menu(bot=bot, chat_id=chat_id, text=menu_text, active=active, user_id=user_id, markup=markup, digest=digest)
+
+
+async def edit_menu(bot, chat_id: int, message_id: int, text: str, markup: InlineKeyboardMarkup) -> bool:
+    """
+    Редактирует сообщение с меню на месте.
+
+    Returns:
+        True, если меню отредактировано (или уже совпадает), False — если сообщение нужно отправить заново
+    """
+    token = _rendering_menu.set(True)
+    try:
+        await bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, reply_markup=markup)
+        return True
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            return True
+        return False
+    finally:
+        _rendering_menu.reset(token)
 
 
 async def delete_menu(bot, chat_id: int, user_id: int = None, current_message_id: int = None):
@@ -86,7 +158,8 @@ async def delete_menu(bot, chat_id: int, user_id: int = None, current_message_id
     if user_id is None:
         return
         
-    last_menu_message_id = await get_last_menu_message_id(user_id)
+    menu = _menus.get(chat_id)
+    last_menu_message_id = menu[0] if menu else await get_last_menu_message_id(user_id)
     if last_menu_message_id and last_menu_message_id != current_message_id:
         try:
             await bot.delete_message(chat_id=chat_id, message_id=last_menu_message_id)
@@ -103,7 +176,8 @@ async def delete_menu(bot, chat_id: int, user_id: int = None, current_message_id
                 raise
 
 
-async def send_menu(bot, chat_id: int, text: str, active: bool, user_id: int) -> int:
+async def send_menu(bot, chat_id: int, text: str, active: bool, user_id: int,
+                    markup: InlineKeyboardMarkup = None, digest: str = None) -> int:
     """
     Отправляет новое меню в чат и обновляет id последнего сообщения.
     
@@ -113,13 +187,15 @@ async def send_menu(bot, chat_id: int, text: str, active: bool, user_id: int) ->
         text: Текст меню
         active: Статус активности
         user_id: ID пользователя
+        markup: Готовая клавиатура меню (опционально)
+        digest: Хэш отрисованного меню (опционально)
     """
     sent = await bot.send_message(
         chat_id=chat_id,
         text=text,
-        reply_markup=config_action_keyboard(active)
+        reply_markup=markup or config_action_keyboard(active)
     )
-    await update_last_menu_message_id(sent.message_id, user_id)
+    await update_last_menu_message_id(sent.message_id, user_id, chat_id, digest)
     return sent.message_id
 
 
@@ -0,0 +1,101 @@
+# --- Standard libraries ---
+import time
+import logging
+from typing import Optional
+
+# --- Internal modules ---
+from services.config import NEGATIVE_CACHE_TTL
+from services.recipients import recipient_key
+
+logger = logging.getLogger(__name__)
+
+# Telegram error markers -> failure class
+FAILURE_MARKERS = {
+    "sold_out": ("STARGIFT_USAGE_LIMITED", "SOLD OUT"),
+    "not_purchasable": ("STARGIFT_INVALID", "STARGIFT_NOT_FOUND", "GIFT_NOT_FOUND"),
+    "recipient": (
+        "PEER_ID_INVALID", "USER_ID_INVALID", "USERNAME_NOT_OCCUPIED", "USERNAME_INVALID",
+        "CHANNEL_INVALID", "CHANNEL_PRIVATE", "CHAT NOT FOUND", "USER NOT FOUND",
+        "BOT WAS BLOCKED", "USER_IS_BLOCKED", "PRIVACY"
+    ),
+}
+
+# Failures that do not depend on the recipient are stored with recipient = None
+GIFT_LEVEL_FAILURES = ("sold_out", "not_purchasable")
+
+_entries: dict[tuple, tuple] = {}  # (gift_id, recipient) -> (failure class, failed_at)
+
+
+def classify_failure(error_text: str) -> Optional[str]:
+    """
+    Maps a Telegram error to a failure class, or None if the failure is not a hard one.
+    """
+    text = error_text.upper()
+    for failure, markers in FAILURE_MARKERS.items():
+        if any(marker in text for marker in markers):
+            return failure
+    return None
+
+
+def mark_failed(gift_id, error_text: str, target_user_id: Optional[int] = None, target_chat_id: Optional[str] = None) -> Optional[str]:
+    """
+    Remembers a hard purchase failure so the worker does not retry it on the next cycle.
+
+    :param gift_id: Gift ID
+    :param error_text: Text of the Telegram error
+    :param target_user_id: Recipient user ID (or None)
+    :param target_chat_id: Recipient chat ID (or None)
+    :return: Failure class, or None if the error is not cached
+    """
+    failure = classify_failure(error_text)
+    if failure is None:
+        return None
+
+    recipient = None if failure in GIFT_LEVEL_FAILURES else recipient_key(target_user_id, target_chat_id)
+    _entries[(str(gift_id), recipient)] = (failure, time.time())
+    logger.info(f"Gift {gift_id} ({recipient or 'any recipient'}) cached as failed: {failure}")
+    _purge()
+    return failure
+
+
+def is_blocked(gift_id, target_user_id: Optional[int] = None, target_chat_id: Optional[str] = None) -> bool:
+    """
+    Checks whether buying the gift for the recipient is known to fail right now.
+    """
+    gift_key = str(gift_id)
+    for key in ((gift_key, None), (gift_key, recipient_key(target_user_id, target_chat_id))):
+        entry = _entries.get(key)
+        if entry is None:
+            continue
+        failure, failed_at = entry
+        if time.time() - failed_at < NEGATIVE_CACHE_TTL[failure]:
+            return True
+        del _entries[key]
+    return False
+
+
+def release_restocked(gifts, fetched_at: float):
+    """
+    Drops "sold out" entries of gifts that a catalog fetched after the failure shows in stock again.
+
+    :param gifts: Gifts of the fetched catalog
+    :param fetched_at: Time of the fetch
+    """
+    if not _entries:
+        return
+    for gift in gifts:
+        key = (str(gift.id), None)
+        entry = _entries.get(key)
+        if entry and entry[0] == "sold_out" and entry[1] < fetched_at and (gift.left or 0) > 0:
+            del _entries[key]
+            logger.info(f"Gift {gift.id} is in stock again")
+
+
+def _purge():
+    """
+    Removes expired entries.
+    """
+    now = time.time()
+    for key, (failure, failed_at) in list(_entries.items()):
+        if now - failed_at >= NEGATIVE_CACHE_TTL[failure]:
+            del _entries[key]
@@ -0,0 +1,206 @@
+# --- Standard libraries ---
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# --- Third-party libraries ---
+from aiogram.exceptions import TelegramRetryAfter
+
+# --- Internal modules ---
+from services.config import OUTBOUND_GLOBAL_RATE, OUTBOUND_CHAT_RATE, OUTBOUND_GROUP_RATE, OUTBOUND_CHAT_BURST
+from utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CRITICAL = 0  # Never queued: purchases, payments, callback answers
+PRIORITY_INTERACTIVE = 1  # Direct replies to the user's actions (default)
+PRIORITY_BULK = 2  # Reports, progress updates, notifications
+
+# Methods that put a message into a chat and count towards Telegram's message limits
+RATE_LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+UNLIMITED_METHODS = {"SendGift", "SendChatAction"}
+# Edits of the same message that may replace each other while they wait in the queue
+COALESCED_METHODS = {"EditMessageText", "EditMessageReplyMarkup", "EditMessageCaption"}
+
+CHAT_BUCKETS_LIMIT = 10000  # Idle per-chat buckets are dropped above this number
+
+_priority: ContextVar[int] = ContextVar("outbound_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def outbound_priority(priority: int):
+    """
+    Sends the bot requests made inside the block with the given priority.
+
+        with outbound_priority(PRIORITY_BULK):
+            await message.answer("Report")
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_rate_limited(method) -> bool:
+    """
+    Checks whether the Bot API method sends or changes a message in a chat.
+    """
+    name = type(method).__name__
+    return name.startswith(RATE_LIMITED_PREFIXES) and name not in UNLIMITED_METHODS
+
+
+class _Outgoing:
+    """
+    A queued request with every caller waiting for it (several when edits were coalesced).
+    """
+    __slots__ = ("make_request", "bot", "method", "chat_id", "key", "futures")
+
+    def __init__(self, make_request, bot, method, chat_id, key):
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.chat_id = chat_id
+        self.key = key
+        self.futures = []
+
+
+class OutboundQueue:
+    """
+    Outbound message queue of the bot.
+    Messages are released under a global token bucket and a token bucket per chat, from priority lanes
+    (interactive before bulk); pending edits of the same message are merged into the latest one.
+    Requests that do not create or change messages (purchases, callback answers, reads) bypass the queue.
+    """
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_rate: float = OUTBOUND_CHAT_RATE,
+                 group_rate: float = OUTBOUND_GROUP_RATE, chat_burst: float = OUTBOUND_CHAT_BURST):
+        """
+        :param global_rate: Messages per second for the whole bot
+        :param chat_rate: Messages per second to one private chat
+        :param group_rate: Messages per second to one group or channel
+        :param chat_burst: Messages a chat can receive at once
+        """
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.chats: dict = {}  # chat_id -> TokenBucket
+        self.lanes = {PRIORITY_INTERACTIVE: deque(), PRIORITY_BULK: deque()}
+        self.edits: dict[tuple, _Outgoing] = {}  # (method, chat_id, message_id) -> queued edit
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def submit(self, make_request, bot, method):
+        """
+        Sends the request through the queue and returns its response.
+        """
+        chat_id = getattr(method, "chat_id", None)
+        priority = _priority.get()
+        if chat_id is None or priority == PRIORITY_CRITICAL or not is_rate_limited(method):
+            return await make_request(bot, method)
+
+        future = asyncio.get_running_loop().create_future()
+        name = type(method).__name__
+        key = (name, chat_id, getattr(method, "message_id", None)) if name in COALESCED_METHODS else None
+        item = self.edits.get(key) if key else None
+        if item is not None:
+            # The queued edit has not been sent yet: send only the latest content
+            item.make_request = make_request
+            item.method = method
+        else:
+            item = _Outgoing(make_request, bot, method, chat_id, key)
+            self.lanes[priority if priority in self.lanes else PRIORITY_BULK].append(item)
+            if key:
+                self.edits[key] = item
+        item.futures.append(future)
+
+        self._ensure_worker()
+        self.wakeup.set()
+        return await future
+
+    def _ensure_worker(self):
+        if self.wakeup is None:
+            self.wakeup = asyncio.Event()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) >= CHAT_BUCKETS_LIMIT:
+                now = time.monotonic()
+                self.chats = {k: b for k, b in self.chats.items() if not b.is_full(now)}
+            is_group = str(chat_id).startswith(("-", "@"))
+            bucket = TokenBucket(self.group_rate if is_group else self.chat_rate, self.chat_burst)
+            self.chats[chat_id] = bucket
+        return bucket
+
+    def _next_ready(self) -> tuple[Optional[_Outgoing], Optional[float]]:
+        """
+        Picks the first request that may be sent now, lanes in priority order, chats in FIFO order.
+
+        :return: (request, None) or (None, seconds until something may be ready / None if the queue is empty)
+        """
+        now = time.monotonic()
+        if not any(self.lanes.values()):
+            return None, None
+        global_wait = self.global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        min_wait = None
+        for priority in sorted(self.lanes):
+            lane = self.lanes[priority]
+            blocked = set()
+            for item in lane:
+                if item.chat_id in blocked:
+                    continue
+                bucket = self._chat_bucket(item.chat_id)
+                wait = bucket.wait_time(now)
+                if wait == 0:
+                    bucket.try_take(now)
+                    self.global_bucket.try_take(now)
+                    lane.remove(item)
+                    if item.key:
+                        self.edits.pop(item.key, None)
+                    return item, None
+                blocked.add(item.chat_id)
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+
+    async def _run(self):
+        """
+        Releases queued requests as soon as the rate limits allow.
+        """
+        while True:
+            item, wait = self._next_ready()
+            if item is not None:
+                asyncio.create_task(self._send(item))
+                continue
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, item: _Outgoing):
+        """
+        Performs the request and hands the result to every waiting caller.
+        """
+        try:
+            response = await item.make_request(item.bot, item.method)
+        except Exception as e:
+            if isinstance(e, TelegramRetryAfter):
+                logger.warning(f"Flood wait of {e.retry_after} seconds for chat {item.chat_id}")
+                self._chat_bucket(item.chat_id).pause(e.retry_after)
+            for future in item.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future in item.futures:
+            if not future.done():
+                future.set_result(response)
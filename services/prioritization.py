@@ -0,0 +1,94 @@
+# --- Standard libraries ---
+import math
+import asyncio
+import logging
+from typing import Callable, Optional
+
+# --- Internal modules ---
+from services.config import SCARCITY_WINDOW
+from services.catalog import Gift, get_catalog_version
+from services.catalog_history import get_drain_rates
+
+logger = logging.getLogger(__name__)
+
+# Strategy name -> function ordering the worker's candidate gifts (first is bought first)
+SORT_STRATEGIES: dict[str, Callable[[list[Gift]], list[Gift]]] = {}
+
+_drain_rates: dict[str, float] = {}  # str(gift id) -> observed drain rate in gifts per second
+_drain_rates_version: Optional[int] = None  # Catalog version the drain rates were computed for
+
+
+def sort_strategy(name: str):
+    """
+    Registers a function as a purchase order strategy under the given name.
+    """
+    def decorator(func):
+        SORT_STRATEGIES[name] = func
+        return func
+    return decorator
+
+
+@sort_strategy("price")
+def by_price(gifts: list[Gift]) -> list[Gift]:
+    """
+    Most expensive gifts first (the default order of the gift lists).
+    """
+    return sorted(gifts, key=lambda g: g.price, reverse=True)
+
+
+async def refresh_drain_rates():
+    """
+    Recomputes the drain rates of all gifts with one history query, off the event loop.
+    The history only changes with the catalog, so the rates are computed once per catalog version.
+    """
+    global _drain_rates, _drain_rates_version
+    version = get_catalog_version()
+    if version == _drain_rates_version:
+        return
+    try:
+        rates = await asyncio.to_thread(get_drain_rates, SCARCITY_WINDOW)
+    except Exception as e:
+        logger.error(f"Failed to get drain rates of gifts: {e}")
+        return
+    _drain_rates = {str(gift_id): rate for gift_id, rate in rates.items()}
+    _drain_rates_version = version
+
+
+@sort_strategy("scarcity")
+def by_scarcity(gifts: list[Gift]) -> list[Gift]:
+    """
+    Gifts expected to sell out soonest first.
+    Gifts with an observed drain rate are ordered by the estimated time until sold out (left / rate),
+    the rest by the share of supply left; unlimited gifts go last. Ties are broken by price.
+    Drain rates are taken from the cache filled by refresh_drain_rates().
+    """
+    rates = _drain_rates
+
+    def key(gift: Gift):
+        if not gift.supply:
+            return (math.inf, math.inf, -gift.price)
+        left = gift.left or 0
+        rate = rates.get(str(gift.id), 0.0)
+        time_to_sell_out = left / rate if rate > 0 else math.inf
+        return (time_to_sell_out, left / gift.supply, -gift.price)
+
+    return sorted(gifts, key=key)
+
+
+async def prioritize_gifts(gifts: list[Gift], strategy: str = "price") -> list[Gift]:
+    """
+    Orders the candidate gifts of a profile with the given strategy.
+    Unknown strategy names fall back to the price order.
+    The scarcity order refreshes the drain rates first if the catalog changed.
+
+    :param gifts: Candidate gifts
+    :param strategy: Name of a registered strategy ("price", "scarcity")
+    :return: Gifts in purchase order
+    """
+    order = SORT_STRATEGIES.get(strategy)
+    if order is None:
+        logger.warning(f"Unknown purchase priority '{strategy}', using price order")
+        order = by_price
+    if order is by_scarcity:
+        await refresh_drain_rates()
+    return order(gifts)
@@ -0,0 +1,47 @@
+# --- Standard libraries ---
+import logging
+from typing import Optional
+
+# --- Internal modules ---
+from services.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ratelimit"
+
+
+class RedisRateLimitStore:
+    """
+    Rate limit store shared by all bot instances: one Redis key per (user, command),
+    set only if absent and expiring after the interval (SET NX PX is atomic).
+    """
+    def __init__(self, redis):
+        """
+        :param redis: redis.asyncio client
+        """
+        self.redis = redis
+
+    async def claim(self, key: str, interval: float) -> bool:
+        """
+        Atomically takes the key for the interval.
+
+        :return: True if the key was free (the call is allowed)
+        """
+        try:
+            return bool(await self.redis.set(f"{KEY_PREFIX}:{key}", 1, nx=True, px=max(1, int(interval * 1000))))
+        except Exception as e:
+            # The limiter must not stop the bot: without the shared store only the local limit applies
+            logger.error(f"Failed to check the shared rate limit: {e}")
+            return True
+
+
+def create_rate_limit_store(redis_url: Optional[str] = None) -> Optional[RedisRateLimitStore]:
+    """
+    Creates the rate limit store shared between bot instances.
+    Without Redis there is nothing to share: the middleware's own token buckets are the only limiter.
+
+    :param redis_url: Redis connection URL, e.g. redis://localhost:6379/0
+    :return: Redis store (using the client shared with the FSM storage) or None
+    """
+    redis = get_redis_client(redis_url)
+    return RedisRateLimitStore(redis) if redis is not None else None
@@ -0,0 +1,273 @@
+# --- Standard libraries ---
+import os
+import json
+import time
+import logging
+from typing import Optional
+
+# --- Third-party libraries ---
+from pyrogram import raw
+from pyrogram.errors import BadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+# --- Internal modules ---
+from services.userbot import sessions_dir, get_userbot_client
+from services.userbot_pool import get_pool
+from services.database import get_user_profiles
+from services.config import RECIPIENT_CHECK_TTL
+
+logger = logging.getLogger(__name__)
+
+_peer_cache: dict[str, dict] = {}  # session_name -> {recipient key: InputPeer}
+_validation: dict[tuple, tuple] = {}  # (user_id, sender, recipient key) -> (valid, checked_at, reason)
+
+
+def recipient_key(target_user_id: Optional[int], target_chat_id: Optional[str]) -> Optional[str]:
+    """
+    Returns the cache key of a recipient: the user id or the lowercase username without "@".
+    """
+    if target_user_id:
+        return str(target_user_id)
+    if target_chat_id:
+        return str(target_chat_id).lstrip("@").lower()
+    return None
+
+
+def _peers_path(session_name: str) -> str:
+    """
+    Path of the file with resolved peers, stored next to the .session file.
+    """
+    return os.path.join(sessions_dir, f"{session_name}.peers.json")
+
+
+def _peer_to_dict(peer) -> Optional[dict]:
+    """
+    Converts an InputPeer to a JSON-serializable dictionary.
+    """
+    if isinstance(peer, raw.types.InputPeerUser):
+        return {"type": "user", "id": peer.user_id, "access_hash": peer.access_hash}
+    if isinstance(peer, raw.types.InputPeerChannel):
+        return {"type": "channel", "id": peer.channel_id, "access_hash": peer.access_hash}
+    if isinstance(peer, raw.types.InputPeerChat):
+        return {"type": "chat", "id": peer.chat_id}
+    if isinstance(peer, raw.types.InputPeerSelf):
+        return {"type": "self"}
+    return None
+
+
+def _dict_to_peer(data: dict):
+    """
+    Restores an InputPeer from its dictionary form.
+    """
+    peer_type = data.get("type")
+    if peer_type == "user":
+        return raw.types.InputPeerUser(user_id=data["id"], access_hash=data["access_hash"])
+    if peer_type == "channel":
+        return raw.types.InputPeerChannel(channel_id=data["id"], access_hash=data["access_hash"])
+    if peer_type == "chat":
+        return raw.types.InputPeerChat(chat_id=data["id"])
+    if peer_type == "self":
+        return raw.types.InputPeerSelf()
+    return None
+
+
+def _load_peers(session_name: str) -> dict:
+    """
+    Returns the peer cache of the session, loading it from disk on first use.
+    """
+    peers = _peer_cache.get(session_name)
+    if peers is not None:
+        return peers
+
+    peers = {}
+    path = _peers_path(session_name)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for key, data in json.load(f).items():
+                    peer = _dict_to_peer(data)
+                    if peer is not None:
+                        peers[key] = peer
+        except Exception as e:
+            logger.error(f"Failed to load resolved peers of {session_name}: {e}")
+    _peer_cache[session_name] = peers
+    return peers
+
+
+def _save_peers(session_name: str):
+    """
+    Writes the peer cache of the session to disk.
+    """
+    peers = _peer_cache.get(session_name, {})
+    data = {key: _peer_to_dict(peer) for key, peer in peers.items()}
+    path = _peers_path(session_name)
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in data.items() if v is not None}, f)
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        logger.error(f"Failed to save resolved peers of {session_name}: {e}")
+
+
+async def resolve_recipient(client, session_name: str, target_user_id: Optional[int], target_chat_id: Optional[str]):
+    """
+    Returns the InputPeer of the recipient for the session, resolving it over the network only once.
+    Access hashes are per account, so the cache is kept per session.
+
+    :param client: Pyrogram Client of the session
+    :param session_name: Name of the session (.session file without extension)
+    :param target_user_id: Recipient user ID (or None)
+    :param target_chat_id: Recipient @username or chat ID (or None)
+    :return: InputPeer
+    """
+    key = recipient_key(target_user_id, target_chat_id)
+    peers = _load_peers(session_name)
+    peer = peers.get(key)
+    if peer is not None:
+        return peer
+
+    target = int(target_user_id) if target_user_id else target_chat_id
+    peer = await client.resolve_peer(target)
+    peers[key] = peer
+    _save_peers(session_name)
+    return peer
+
+
+def forget_recipient(session_name: str, target_user_id: Optional[int], target_chat_id: Optional[str]):
+    """
+    Drops a cached peer that Telegram rejected (e.g. the access hash became invalid).
+    """
+    peers = _load_peers(session_name)
+    if peers.pop(recipient_key(target_user_id, target_chat_id), None) is not None:
+        _save_peers(session_name)
+
+
+def forget_session_peers(session_name: str):
+    """
+    Drops all resolved peers of a session (access hashes are valid only for the account that resolved them).
+    """
+    _peer_cache.pop(session_name, None)
+    path = _peers_path(session_name)
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except Exception as e:
+            logger.error(f"Failed to delete resolved peers of {session_name}: {e}")
+
+
+async def _userbot_sessions(user_id: int) -> list[tuple]:
+    """
+    Returns (session_name, client) of every userbot account of the user.
+    """
+    sessions = [(s.session_name, s.client) for s in get_pool(user_id)]
+    if not sessions:
+        client = await get_userbot_client(user_id)
+        if client:
+            sessions = [(f"userbot_{user_id}", client)]
+    return sessions
+
+
+async def _resolve_username(user_id: int, key: str, username: str) -> tuple[Optional[bool], Optional[str]]:
+    """
+    Resolves a @username through the user's userbot session, if there is one.
+
+    :return: (valid, reason), valid is None if no session could answer
+    """
+    for session_name, client in await _userbot_sessions(user_id):
+        try:
+            await resolve_recipient(client, session_name, None, username)
+            return True, None
+        except (BadRequest, KeyError, ValueError) as e:
+            logger.warning(f"Recipient {key} does not resolve: {e}")
+            return False, str(e)
+        except Exception as e:
+            logger.error(f"Failed to resolve recipient {key} through {session_name}: {e}")
+    return None, None
+
+
+async def validate_recipient(bot, user_id: int, sender: str, target_user_id: Optional[int], target_chat_id: Optional[str]) -> Optional[bool]:
+    """
+    Checks that the recipient is reachable through the chosen sender and stores the result with a TTL.
+    For the userbot the recipient is resolved in every account of the pool, which also warms the peer cache.
+    For the bot a recipient is invalid only on a definite error (a @username that does not resolve);
+    a user who never started the bot stays unknown, because sendGift reaches them anyway.
+
+    :param bot: aiogram bot object
+    :param user_id: Telegram ID of the profile owner
+    :param sender: "bot" or "userbot"
+    :param target_user_id: Recipient user ID (or None)
+    :param target_chat_id: Recipient @username or chat ID (or None)
+    :return: True/False, or None if the check could not be made (network error, no userbot session)
+    """
+    key = recipient_key(target_user_id, target_chat_id)
+    if key is None:
+        return None
+
+    valid = None
+    reason = None
+    if sender == "userbot":
+        for session_name, client in await _userbot_sessions(user_id):
+            try:
+                await resolve_recipient(client, session_name, target_user_id, target_chat_id)
+                valid = True
+            except (BadRequest, KeyError, ValueError) as e:
+                reason = str(e)
+                valid = valid or False
+                logger.warning(f"Recipient {key} is not reachable for {session_name}: {e}")
+            except Exception as e:
+                logger.error(f"Failed to check recipient {key} for {session_name}: {e}")
+    else:
+        try:
+            await bot.get_chat(int(target_user_id) if target_user_id else target_chat_id)
+            valid = True
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
+            # The Bot API cannot see users who never started the bot, but sendGift still reaches them,
+            # so this is not a definite error. Only a @username that does not resolve is one.
+            logger.info(f"Recipient {key} is not visible to the bot: {e}")
+            if target_chat_id and not target_user_id:
+                valid, reason = await _resolve_username(user_id, key, target_chat_id)
+        except Exception as e:
+            logger.error(f"Failed to check recipient {key} for the bot: {e}")
+
+    if valid is not None:
+        _validation[(user_id, sender, key)] = (valid, time.time(), reason)
+    return valid
+
+
+def get_recipient_status(user_id: int, sender: str, target_user_id: Optional[int], target_chat_id: Optional[str],
+                         ttl: float = RECIPIENT_CHECK_TTL) -> Optional[bool]:
+    """
+    Returns the stored result of the recipient check, or None if it is unknown or expired.
+    """
+    result = _validation.get((user_id, sender, recipient_key(target_user_id, target_chat_id)))
+    if result is None or time.time() - result[1] > ttl:
+        return None
+    return result[0]
+
+
+async def validate_user_recipients(bot, user_id: int) -> int:
+    """
+    Loads the user's profiles and checks their recipients (see validate_recipient).
+    Errors are logged, never raised: the check runs in the background after a profile is saved.
+
+    :return: Number of unreachable recipients
+    """
+    try:
+        profiles = await get_user_profiles(user_id)
+        invalid = 0
+        for profile in profiles:
+            valid = await validate_recipient(
+                bot,
+                user_id,
+                profile.get("sender", "bot"),
+                profile.get("target_user_id"),
+                profile.get("target_chat_id")
+            )
+            if valid is False:
+                invalid += 1
+        if invalid:
+            logger.warning(f"User {user_id} has {invalid} profiles with unreachable recipients")
+        return invalid
+    except Exception as e:
+        logger.error(f"Failed to check recipients of {user_id}: {e}")
+        return 0
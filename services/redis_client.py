@@ -0,0 +1,28 @@
+# --- Standard libraries ---
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_clients: dict = {}  # url -> redis.asyncio.Redis
+
+
+def get_redis_client(redis_url: Optional[str]):
+    """
+    Returns the Redis client for the URL, shared by the FSM storage and the rate limiter.
+
+    :param redis_url: Redis connection URL, e.g. redis://localhost:6379/0
+    :return: redis.asyncio client or None if no URL is given or the redis package is not installed
+    """
+    if not redis_url:
+        return None
+    client = _clients.get(redis_url)
+    if client is None:
+        try:
+            from redis.asyncio import Redis
+        except ImportError:
+            logger.warning("REDIS_URL is set but the redis package is not installed, using local storage")
+            return None
+        client = Redis.from_url(redis_url)
+        _clients[redis_url] = client
+    return client
@@ -1,6 +1,9 @@
 # --- Standard libraries ---
 from datetime import datetime
+import asyncio
 import logging
+import glob
+import time
 import os
 import builtins
 
@@ -14,11 +17,21 @@ from pyrogram.errors import (
     PhoneNumberInvalid,
     FloodWait,
     BadRequest,
-    RPCError
+    RPCError,
+    Unauthorized
 )
+from pyrogram import raw
 
 # --- Internal modules ---
-from services.config import get_valid_config, save_config
+from services.config import (
+    get_valid_config,
+    save_config,
+    USERBOT_START_CONCURRENCY,
+    USERBOT_HEALTH_INTERVAL,
+    USERBOT_PING_TIMEOUT
+)
+from services.catalog import drop_snapshot
+from services.userbot_pool import add_session, remove_pool, get_pool
 from utils.proxy import get_userbot_proxy
 
 logger = logging.getLogger(__name__)
@@ -27,6 +40,16 @@ sessions_dir = os.path.abspath("sessions")
 os.makedirs(sessions_dir, exist_ok=True)
 
 _clients = {}  # Temporary storage of Client by user_id
+_revoked_clients = set()  # Clients whose authorization was revoked by Telegram
+_login_api_hashes = {}  # user_id -> api_hash of an unfinished login (in memory only, never in the FSM storage)
+
+
+def remember_login_api_hash(user_id: int, api_hash: str):
+    """
+    Keeps the api_hash entered in the login wizard until start_userbot() picks it up.
+    Secrets of the login are held in memory instead of the persisted FSM data.
+    """
+    _login_api_hashes[user_id] = api_hash
 
 def is_userbot_active(user_id: int) -> bool:
     """
@@ -36,6 +59,13 @@ def is_userbot_active(user_id: int) -> bool:
     return bool(info and info.get("client") and info.get("started"))
 
 
+def get_active_userbot_ids() -> list[int]:
+    """
+    Returns the user_ids of all running userbot sessions.
+    """
+    return [user_id for user_id in list(_clients) if is_userbot_active(user_id)]
+
+
 async def try_start_userbot_from_config(user_id: int):
     """
     Checks if there is a valid userbot session for the user and starts it.
@@ -93,6 +123,8 @@ async def try_start_userbot_from_config(user_id: int):
                 "client": app,
                 "started": True,
             }
+            await _register_pool_session(user_id, session_name, app)
+            await start_extra_userbot_sessions(user_id, api_id, api_hash)
 
             return True
 
@@ -126,6 +158,79 @@ async def try_start_userbot_from_config(user_id: int):
     return False
 
 
+async def _register_pool_session(user_id: int, session_name: str, app: Client):
+    """
+    Adds a started account to the user's userbot pool together with its star balance.
+    """
+    try:
+        balance = await app.get_stars_balance()
+    except Exception as e:
+        logger.error(f"Failed to get star balance of {session_name}: {e}")
+        balance = 0
+    add_session(user_id, session_name, app, balance=balance)
+
+
+async def start_extra_userbot_sessions(user_id: int, api_id: int, api_hash: str) -> int:
+    """
+    Starts additional userbot accounts of the user concurrently.
+    Extra accounts are authorized .session files named userbot_<user_id>_<suffix>.session;
+    they are started with the user's api_id/api_hash and join the purchase pool.
+
+    :return: Number of started extra accounts
+    """
+    async def start_one(session_path: str) -> bool:
+        session_name = os.path.basename(session_path)[:-len(".session")]
+        app = await create_userbot_client(user_id, session_name, api_id, api_hash, None, sessions_dir, None)
+        try:
+            await app.start()
+            me = await app.get_me()
+            logger.info(f"Extra userbot {session_name} authorized as {me.first_name} ({me.id})")
+            await _register_pool_session(user_id, session_name, app)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to start extra userbot {session_name}: {e}")
+            try:
+                await app.stop()
+            except Exception:
+                pass
+            return False
+
+    pattern = os.path.join(sessions_dir, f"userbot_{user_id}_*.session")
+    results = await asyncio.gather(*(start_one(path) for path in sorted(glob.glob(pattern))))
+    return sum(results)
+
+
+async def start_userbots_bulk(user_ids, concurrency: int = USERBOT_START_CONCURRENCY) -> dict:
+    """
+    Starts the userbot sessions of many users concurrently, at most `concurrency` logins at a time,
+    so restart-to-ready time does not grow linearly with the number of sessions.
+
+    :param user_ids: Telegram IDs of the session owners
+    :param concurrency: Maximum number of sessions starting simultaneously
+    :return: Dictionary {user_id: (started, seconds)}
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    report = {}
+
+    async def start_one(user_id: int):
+        async with semaphore:
+            started_at = time.monotonic()
+            try:
+                started = await try_start_userbot_from_config(user_id)
+            except Exception as e:
+                logger.error(f"Failed to start userbot of {user_id}: {e}")
+                started = False
+            elapsed = time.monotonic() - started_at
+            report[user_id] = (started, elapsed)
+            logger.info(f"Userbot of {user_id}: {'started' if started else 'not started'} in {elapsed:.2f} sec")
+
+    started_at = time.monotonic()
+    await asyncio.gather(*(start_one(user_id) for user_id in user_ids))
+    ok = sum(1 for started, _ in report.values() if started)
+    logger.info(f"Userbots started: {ok}/{len(report)} in {time.monotonic() - started_at:.2f} sec")
+    return report
+
+
 async def _clear_userbot_config(user_id: int):
     """
     Resets USERBOT fields in the config.
@@ -188,8 +293,12 @@ async def start_userbot(message, state):
     session_path = os.path.join(sessions_dir, f"{session_name}.session")
 
     api_id = data["api_id"]
-    api_hash = data["api_hash"]
+    api_hash = _login_api_hashes.pop(user_id, None)
     phone_number = data["phone"]
+    if not api_hash:
+        logger.error("api_hash not found. Try starting over.")
+        await message.answer("🚫 Login data was lost. Try starting over.")
+        return False
 
     app = await create_userbot_client(user_id, session_name, api_id, api_hash, phone_number, sessions_dir, None)
 
@@ -200,7 +309,8 @@ async def start_userbot(message, state):
         _clients[user_id] = {
             "client": app,
             "phone_code_hash": sent.phone_code_hash,
-            "phone": phone_number
+            "phone": phone_number,
+            "api_hash": api_hash
         }
         return True
     except ApiIdInvalid:
@@ -233,14 +343,14 @@ async def start_userbot(message, state):
             return False
 
 
-async def continue_userbot_signin(message, state):
+async def continue_userbot_signin(message, state, code: str):
     """
     Continues userbot authorization using confirmation code.
+    The code is passed directly and never stored in the FSM data.
     Returns flags: success, password needed, and retry needed.
     """
     data = await state.get_data()
     user_id = message.from_user.id
-    code = data["code"]
     attempts = data.get("code_attempts", 0)
 
     client_info = _clients.get(user_id)
@@ -253,7 +363,7 @@ async def continue_userbot_signin(message, state):
     phone = client_info["phone"]
     phone_code_hash = client_info["phone_code_hash"]
     api_id = data["api_id"]
-    api_hash = data["api_hash"]
+    api_hash = client_info["api_hash"]
 
     if not code:
         logger.error("Code not specified.")
@@ -283,6 +393,7 @@ async def continue_userbot_signin(message, state):
             "client": app,
             "started": True,
         }
+        await _register_pool_session(user_id, f"userbot_{user_id}", app)
 
         # Save data
         from services.database import update_user_userbot_data
@@ -317,9 +428,10 @@ async def continue_userbot_signin(message, state):
         return False, False, False
 
 
-async def finish_userbot_signin(message, state):
+async def finish_userbot_signin(message, state, password: str):
     """
     Finishes userbot authorization after entering password.
+    The password is passed directly and never stored in the FSM data.
     Saves session and data to config on success.
     """
     data = await state.get_data()
@@ -332,9 +444,8 @@ async def finish_userbot_signin(message, state):
         return False, False
     
     app = client_info["client"]
-    password = data["password"]
     api_id = data["api_id"]
-    api_hash = data["api_hash"]
+    api_hash = client_info["api_hash"]
     phone = data["phone"]
     attempts = data.get("password_attempts", 0)
 
@@ -362,6 +473,7 @@ async def finish_userbot_signin(message, state):
             "client": app,
             "started": True,
         }
+        await _register_pool_session(user_id, f"userbot_{user_id}", app)
 
         # Save data
         from services.database import update_user_userbot_data
@@ -442,6 +554,15 @@ async def delete_userbot_session(user_id: int) -> bool:
         except Exception as e:
             logger.error(f"Error stopping client: {e}")
 
+    # Stop extra accounts of the pool
+    for pool_session in remove_pool(user_id):
+        if client_info and pool_session.client is client_info.get("client"):
+            continue
+        try:
+            await pool_session.client.stop()
+        except Exception as e:
+            logger.error(f"Error stopping {pool_session.session_name}: {e}")
+
     # Delete session file
     if os.path.exists(session_path):
         try:
@@ -458,21 +579,39 @@ async def delete_userbot_session(user_id: int) -> bool:
         except Exception as e:
             logger.error(f"Failed to delete journal: {e}")
 
+    # Delete resolved peers of the account
+    from services.recipients import forget_session_peers
+    forget_session_peers(session_name)
+
     # Clear config
     await _clear_userbot_config(user_id)
 
     # Remove from memory
     if user_id in _clients:
         del _clients[user_id]
+    drop_snapshot(user_id)
 
     return True
 
 
-async def get_userbot_stars_balance() -> int:
+async def get_userbot_stars_balance(user_id: int = None) -> int:
     """
     Gets the star balance via an authorized userbot.
+    If the user has a pool of userbot accounts, the balances of all accounts are refreshed and summed.
     """
-    user_id = next(iter(_clients), None)
+    pool = get_pool(user_id) if user_id is not None else []
+    if pool:
+        total = 0
+        for pool_session in pool:
+            try:
+                pool_session.balance = await pool_session.client.get_stars_balance()
+            except Exception as e:
+                logger.error(f"Error getting star balance of {pool_session.session_name}: {e}")
+            total += pool_session.balance
+        return total
+
+    if user_id is None:
+        user_id = next(iter(_clients), None)
     client_info = _clients.get(user_id)
     if not client_info or not client_info.get("client"):
         logger.error("Userbot not active or not authorized.")
@@ -485,4 +624,88 @@ async def get_userbot_stars_balance() -> int:
         return stars
     except Exception as e:
         logger.error(f"Error getting userbot star balance: {e}")
-        return 0
\ No newline at end of file
+        return 0
+
+
+async def _ping_client(app: Client) -> float:
+    """
+    Sends a cheap RPC through the session and returns its round-trip time in seconds.
+    """
+    started_at = time.monotonic()
+    await asyncio.wait_for(app.invoke(raw.functions.updates.GetState()), timeout=USERBOT_PING_TIMEOUT)
+    return time.monotonic() - started_at
+
+
+def _set_session_health(user_id: int, app: Client, healthy: bool, rtt: float = None):
+    """
+    Stores the health check result in _clients and in the pool entry of the same client.
+    """
+    info = _clients.get(user_id)
+    if info and info.get("client") is app:
+        info["started"] = healthy
+        if rtt is not None:
+            info["rtt"] = rtt
+    for pool_session in get_pool(user_id):
+        if pool_session.client is app:
+            pool_session.healthy = healthy
+            if rtt is not None:
+                pool_session.rtt = rtt
+
+
+async def check_userbot_session(user_id: int, app: Client, name: str) -> bool:
+    """
+    Pings one userbot session; on failure marks it inactive at once and tries to reconnect.
+    A revoked session is left inactive until the user connects the userbot again.
+
+    :return: True if the session is alive after the check
+    """
+    try:
+        rtt = await _ping_client(app)
+        _set_session_health(user_id, app, True, rtt)
+        logger.debug(f"Userbot {name} is alive, RTT {rtt * 1000:.0f} ms")
+        return True
+    except Unauthorized as e:
+        _set_session_health(user_id, app, False)
+        _revoked_clients.add(app)
+        logger.error(f"Userbot {name} session revoked: {e}")
+        return False
+    except Exception as e:
+        _set_session_health(user_id, app, False)
+        logger.warning(f"Userbot {name} does not respond ({e!r}), reconnecting...")
+
+    try:
+        await app.restart()
+        rtt = await _ping_client(app)
+        _set_session_health(user_id, app, True, rtt)
+        logger.info(f"Userbot {name} reconnected, RTT {rtt * 1000:.0f} ms")
+        return True
+    except Unauthorized as e:
+        _revoked_clients.add(app)
+        logger.error(f"Userbot {name} session revoked: {e}")
+    except Exception as e:
+        logger.error(f"Failed to reconnect userbot {name}: {e}")
+    return False
+
+
+async def userbot_health_supervisor(interval: float = USERBOT_HEALTH_INTERVAL):
+    """
+    Background task: periodically checks every started userbot session (including extra pool accounts),
+    so a dropped connection is found and repaired before a purchase needs it.
+
+    :param interval: Pause between rounds of checks (in seconds)
+    """
+    while True:
+        checks = []
+        for user_id, info in list(_clients.items()):
+            # Entries without "started" belong to an authorization in progress
+            app = info.get("client")
+            if app and "started" in info and app not in _revoked_clients:
+                checks.append(check_userbot_session(user_id, app, f"userbot_{user_id}"))
+            for pool_session in get_pool(user_id):
+                if pool_session.client is not app and pool_session.client not in _revoked_clients:
+                    checks.append(check_userbot_session(user_id, pool_session.client, pool_session.session_name))
+        try:
+            await asyncio.gather(*checks)
+        except Exception as e:
+            logger.error(f"Error in userbot_health_supervisor: {e}")
+        await asyncio.sleep(interval)
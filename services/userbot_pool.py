@@ -0,0 +1,111 @@
+# --- Standard libraries ---
+import time
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PoolSession:
+    """
+    One userbot account in a tenant's pool.
+
+    :param session_name: Name of the .session file (without extension)
+    :param client: Started Pyrogram Client
+    :param weight: Relative share of purchases dispatched to this account
+    :param balance: Last known star balance of the account
+    :param flood_until: time.time() until which the account is in flood wait
+    :param healthy: Result of the last health check
+    :param rtt: Round-trip time of the last health check (in seconds)
+    """
+    session_name: str
+    client: object
+    weight: int = 1
+    balance: int = 0
+    flood_until: float = 0
+    healthy: bool = True
+    rtt: float = 0.0
+    current_weight: int = 0  # Running counter of the smooth weighted round-robin
+
+    def is_available(self, price: int = 0) -> bool:
+        """Checks that the account is connected, not flood-limited and can afford the gift."""
+        return self.healthy and self.flood_until <= time.time() and self.balance >= price
+
+
+_pools: dict[int, list[PoolSession]] = {}  # tenant user_id -> userbot accounts
+
+
+def add_session(tenant_id: int, session_name: str, client, weight: int = 1, balance: int = 0) -> PoolSession:
+    """
+    Adds a started userbot account to the tenant's pool (replaces one with the same session name).
+    """
+    pool = [s for s in _pools.get(tenant_id, []) if s.session_name != session_name]
+    session = PoolSession(session_name=session_name, client=client, weight=max(1, weight), balance=balance)
+    pool.append(session)
+    _pools[tenant_id] = pool
+    logger.info(f"Userbot session {session_name} added to pool of {tenant_id} ({len(pool)} in total)")
+    return session
+
+
+def remove_session(tenant_id: int, session_name: str):
+    """
+    Removes one account from the tenant's pool.
+    """
+    _pools[tenant_id] = [s for s in _pools.get(tenant_id, []) if s.session_name != session_name]
+    if not _pools[tenant_id]:
+        del _pools[tenant_id]
+
+
+def remove_pool(tenant_id: int) -> list[PoolSession]:
+    """
+    Removes the whole pool of the tenant and returns its accounts.
+    """
+    return _pools.pop(tenant_id, [])
+
+
+def get_pool(tenant_id: int) -> list[PoolSession]:
+    """
+    Returns all accounts of the tenant.
+    """
+    return list(_pools.get(tenant_id, []))
+
+
+def get_pool_balance(tenant_id: int) -> int:
+    """
+    Returns the total known star balance of the tenant's accounts.
+    """
+    return sum(s.balance for s in _pools.get(tenant_id, []))
+
+
+def acquire_session(tenant_id: int, price: int = 0) -> Optional[PoolSession]:
+    """
+    Picks the next account for a purchase using smooth weighted round-robin.
+    Accounts in flood wait or without enough stars are skipped.
+
+    :param tenant_id: Telegram ID of the tenant
+    :param price: Price of the gift to be bought
+    :return: Account or None if no account can buy now
+    """
+    candidates = [s for s in _pools.get(tenant_id, []) if s.is_available(price)]
+    if not candidates:
+        return None
+
+    total = 0
+    best = None
+    for session in candidates:
+        session.current_weight += session.weight
+        total += session.weight
+        if best is None or session.current_weight > best.current_weight:
+            best = session
+    best.current_weight -= total
+    return best
+
+
+def mark_flood(session: PoolSession, seconds: float):
+    """
+    Takes the account out of rotation for the duration of a flood wait.
+    """
+    session.flood_until = time.time() + seconds
+    logger.warning(f"Userbot session {session.session_name} in flood wait for {seconds} seconds")
@@ -0,0 +1,61 @@
+# --- Standard libraries ---
+import importlib
+
+# --- Third-party libraries ---
+import pytest
+
+# --- Internal modules ---
+import services.catalog
+
+
+@pytest.fixture
+def catalog():
+    """Fresh catalog module state for every test."""
+    return importlib.reload(services.catalog)
+
+
+def test_userbot_republish_keeps_its_version_after_bot_publish(catalog):
+    userbot_gifts = [catalog.Gift(1, 100, 10, 5), catalog.Gift(2, 50, None, None)]
+    bot_gifts = [catalog.Gift("3", 25, 100, 40)]
+
+    first = catalog.publish_snapshot([7], userbot_gifts)
+    bot = catalog.publish_catalog("bot", bot_gifts)
+    again = catalog.publish_snapshot([7], list(reversed(userbot_gifts)))
+
+    assert (first.version, bot.version) == (1, 2)
+    assert again.version == first.version
+    assert catalog.get_catalog_snapshot(bot.version).gifts == bot.gifts
+    assert catalog.get_catalog_gift(bot.version, "3") == bot_gifts[0]
+    assert catalog.get_catalog_gift(first.version, 1) == userbot_gifts[0]
+
+
+def test_changed_catalogs_get_new_versions(catalog):
+    first = catalog.publish_snapshot([7], [catalog.Gift(1, 100, 10, 5)])
+    bot = catalog.publish_catalog("bot", [catalog.Gift("3", 25, 100, 40)])
+    changed = catalog.publish_snapshot([7], [catalog.Gift(1, 100, 10, 4)])
+    bot_again = catalog.publish_catalog("bot", [catalog.Gift("3", 25, 100, 40)])
+
+    assert changed.version > bot.version > first.version
+    assert bot_again.version == bot.version
+    assert catalog.get_catalog_gift(first.version, 1).left == 5
+    assert catalog.get_catalog_gift(changed.version, 1).left == 4
+
+
+def test_merge_deduplicates_bot_and_userbot_ids(catalog):
+    bot_gift = catalog.Gift("5170145012310081615", 15, 1000, 300)
+    userbot_gift = catalog.Gift(5170145012310081615, 15, 1000, 250)
+
+    merged = catalog.merge_gift_lists([bot_gift], [userbot_gift])
+
+    assert merged == [bot_gift._replace(left=250)]
+
+
+def test_build_snapshot_does_not_reuse_a_colliding_catalog(catalog, monkeypatch):
+    monkeypatch.setattr(catalog, "catalog_hash", lambda gifts: 42)
+    first = catalog.build_snapshot([catalog.Gift(1, 100, 10, 5)])
+    other = catalog.build_snapshot([catalog.Gift(2, 50, 10, 5)])
+    same = catalog.build_snapshot([catalog.Gift(2, 50, 10, 5)])
+
+    assert first.gifts != other.gifts
+    assert other.gifts == (catalog.Gift(2, 50, 10, 5),)
+    assert same.index is other.index
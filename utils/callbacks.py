@@ -0,0 +1,103 @@
+# --- Standard libraries ---
+import inspect
+import logging
+from typing import Callable, Optional
+
+# --- Third-party libraries ---
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = ":"
+MAX_CALLBACK_DATA = 64  # Telegram limit for callback data, bytes
+
+
+def pack_callback(name: str, *args) -> str:
+    """
+    Encodes button callback data: route name and arguments joined with ':'.
+
+        pack_callback("profile_edit", 0) -> "profile_edit:0"
+    """
+    data = SEPARATOR.join((name, *map(str, args)))
+    if len(data.encode()) > MAX_CALLBACK_DATA:
+        raise ValueError(f"Callback data is longer than {MAX_CALLBACK_DATA} bytes: {data}")
+    return data
+
+
+class _Route:
+    __slots__ = ("handler", "types", "params")
+
+    def __init__(self, handler: Callable, types: tuple):
+        self.handler = handler
+        self.types = types
+        # Names of the keyword arguments (state, bot, ...) the handler takes from aiogram
+        self.params = set(list(inspect.signature(handler).parameters)[1 + len(types):])
+
+
+class CallbackRoutes:
+    """
+    Callback query router indexed by route name.
+    A button press is resolved with one dict lookup on the name before the first ':', the arguments are
+    converted to the declared types and passed to the handler positionally after the CallbackQuery:
+
+        @callback_routes.route("profile_edit", int)
+        async def on_profile_edit(call: CallbackQuery, idx: int, state: FSMContext): ...
+
+    Data in the older "name_arg" form (buttons sent before the codec) is resolved by its last "_".
+    """
+    def __init__(self):
+        self.routes: dict[str, _Route] = {}
+
+    def route(self, name: str, *types: type):
+        """
+        Registers a handler for the callback data packed with pack_callback(name, *args).
+
+        :param name: Route name (without ':')
+        :param types: Types of the arguments, e.g. int, str
+        """
+        def decorator(handler):
+            if name in self.routes:
+                raise ValueError(f"Callback route '{name}' is already registered")
+            self.routes[name] = _Route(handler, types)
+            return handler
+        return decorator
+
+    def resolve(self, data: str) -> Optional[tuple[_Route, list]]:
+        """
+        Finds the route of the callback data and parses its arguments.
+
+        :return: (route, arguments) or None if nothing matches
+        """
+        name, _, raw = data.partition(SEPARATOR)
+        route = self.routes.get(name)
+        if route is None and not raw:
+            name, _, raw = data.rpartition("_")
+            route = self.routes.get(name) if raw else None
+        if route is None:
+            return None
+
+        parts = raw.split(SEPARATOR) if raw else []
+        if len(parts) != len(route.types):
+            return None
+        try:
+            return route, [cast(part) for cast, part in zip(route.types, parts)]
+        except ValueError:
+            return None
+
+    async def _match(self, call: CallbackQuery):
+        resolved = self.resolve(call.data or "")
+        return {"callback_route": resolved} if resolved else False
+
+    async def _dispatch(self, call: CallbackQuery, callback_route: tuple, **kwargs):
+        route, args = callback_route
+        return await route.handler(call, *args, **{k: v for k, v in kwargs.items() if k in route.params})
+
+    def register(self, router):
+        """
+        Registers the single callback query handler of all routes in the router or dispatcher.
+        """
+        router.callback_query.register(self._dispatch, self._match)
+        logger.info(f"Registered {len(self.routes)} callback routes")
+
+
+callback_routes = CallbackRoutes()
@@ -0,0 +1,59 @@
+# --- Standard libraries ---
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+# --- Internal modules ---
+from utils.token_bucket import TokenBucket
+
+EVICTIONS_PER_HIT = 2  # Idle buckets dropped per call at most (more than the one a call can add)
+
+
+class KeyedRateLimiter:
+    """
+    Token bucket per key (e.g. (user_id, command)) with bounded memory.
+    Buckets are kept in least-recently-used order: idle buckets at the old end are dropped as soon as
+    they are full again (dropping them changes nothing), and the oldest are dropped above `max_keys`.
+    """
+    __slots__ = ("buckets", "max_keys")
+
+    def __init__(self, max_keys: int):
+        """
+        :param max_keys: Maximum number of buckets kept at once
+        """
+        self.buckets: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+        self.max_keys = max_keys
+
+    def hit(self, key: Hashable, interval: float, burst: float = 1, now: float = None) -> bool:
+        """
+        Takes a token from the key's bucket: `burst` hits at once, then one hit per `interval` seconds.
+
+        :return: True if the hit is allowed
+        """
+        now = time.monotonic() if now is None else now
+        buckets = self.buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(1 / interval, burst)
+            bucket.updated_at = now
+            buckets[key] = bucket
+        else:
+            buckets.move_to_end(key)
+        allowed = bucket.try_take(now)
+        self._evict(now)
+        return allowed
+
+    def _evict(self, now: float):
+        buckets = self.buckets
+        while len(buckets) > self.max_keys:
+            buckets.popitem(last=False)
+        for _ in range(EVICTIONS_PER_HIT):
+            if not buckets:
+                return
+            key = next(iter(buckets))
+            if not buckets[key].is_full(now):
+                return
+            del buckets[key]
+
+    def __len__(self) -> int:
+        return len(self.buckets)
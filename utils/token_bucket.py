@@ -0,0 +1,62 @@
+# --- Standard libraries ---
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: refills at `rate` tokens per second up to `capacity`.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: Tokens added per second
+        :param capacity: Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self, now: float = None, tokens: float = 1) -> bool:
+        """
+        Takes tokens if there are enough of them.
+
+        :return: True if the tokens were taken
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, now: float = None, tokens: float = 1) -> float:
+        """
+        Seconds until the given number of tokens is available.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def pause(self, seconds: float, now: float = None):
+        """
+        Empties the bucket so that no token is available for the given time (e.g. after a flood wait).
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def is_full(self, now: float = None) -> bool:
+        """
+        Checks that the bucket is full (an idle bucket can be dropped and recreated later).
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return self.tokens >= self.capacity